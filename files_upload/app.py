@@ -1,13 +1,34 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, send_from_directory, send_file, jsonify, abort, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user, UserMixin
 from werkzeug.utils import secure_filename
+from urllib.parse import quote
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone, timedelta
 import os
-from sqlalchemy import text, func
+import hashlib
+import mimetypes
+import uuid
+import threading
+import shutil
+import subprocess
+import tempfile
+import zipfile
+import io
+import csv
+import json
+import time
+import queue
+import multiprocessing
+from collections import OrderedDict, Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sqlalchemy import text, func, case, or_, and_, inspect, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import joinedload, Session
+from sqlalchemy.dialects import postgresql, sqlite
 from werkzeug.exceptions import RequestEntityTooLarge
 from dotenv import load_dotenv
+import click
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")
@@ -41,10 +62,107 @@ try:
     app.config["TIME_OFFSET_HOURS"] = int(os.getenv("TIME_OFFSET_HOURS", "2"))
 except Exception:
     app.config["TIME_OFFSET_HOURS"] = 2
+try:
+    app.config["SEARCH_PAGE_SIZE"] = int(os.getenv("SEARCH_PAGE_SIZE", "25"))
+except Exception:
+    app.config["SEARCH_PAGE_SIZE"] = 25
+try:
+    app.config["BULK_REVIEW_MAX"] = int(os.getenv("BULK_REVIEW_MAX", "500"))
+except Exception:
+    app.config["BULK_REVIEW_MAX"] = 500
+try:
+    app.config["IMPORT_HASH_WORKERS"] = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 1)))
+except Exception:
+    app.config["IMPORT_HASH_WORKERS"] = os.cpu_count() or 1
+# user_loader cache: seconds an entry lives, max entries per worker, optional shared Redis backend.
+# Kept short by default because without Redis a deleted or changed account stays cached in the
+# other workers until its entry expires
+try:
+    app.config["USER_CACHE_TTL"] = int(os.getenv("USER_CACHE_TTL", "5"))
+except Exception:
+    app.config["USER_CACHE_TTL"] = 5
+try:
+    app.config["USER_CACHE_SIZE"] = int(os.getenv("USER_CACHE_SIZE", "2048"))
+except Exception:
+    app.config["USER_CACHE_SIZE"] = 2048
+app.config["USER_CACHE_REDIS_URL"] = os.getenv("USER_CACHE_REDIS_URL")
 try:
     app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", str(20 * 1024 * 1024)))
 except Exception:
     app.config["MAX_CONTENT_LENGTH"] = 20 * 1024 * 1024
+# File serving: "app" streams from the worker; "x-accel" (nginx) or "x-sendfile" (Apache/lighttpd)
+# only authorize in Python and let the web server send the bytes
+app.config["FILE_SERVE_MODE"] = (os.getenv("FILE_SERVE_MODE") or "app").strip().lower()
+app.config["X_ACCEL_PREFIX"] = os.getenv("X_ACCEL_PREFIX", "/_protected_uploads/")
+# Chunked uploads: the total file size is limited separately from the per-request body limit
+try:
+    app.config["UPLOAD_MAX_LENGTH"] = int(os.getenv("UPLOAD_MAX_LENGTH", str(200 * 1024 * 1024)))
+except Exception:
+    app.config["UPLOAD_MAX_LENGTH"] = 200 * 1024 * 1024
+try:
+    app.config["UPLOAD_CHUNK_SIZE"] = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+except Exception:
+    app.config["UPLOAD_CHUNK_SIZE"] = 4 * 1024 * 1024
+try:
+    app.config["UPLOAD_SESSION_HOURS"] = int(os.getenv("UPLOAD_SESSION_HOURS", "24"))
+except Exception:
+    app.config["UPLOAD_SESSION_HOURS"] = 24
+# Thumbnail/preview renditions: generated in a background pool into a size-bounded disk cache
+app.config["RENDITION_FOLDER"] = os.getenv("RENDITION_FOLDER") or os.path.join(instance_dir, "renditions")
+try:
+    app.config["RENDITION_CACHE_MAX_BYTES"] = int(os.getenv("RENDITION_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+except Exception:
+    app.config["RENDITION_CACHE_MAX_BYTES"] = 512 * 1024 * 1024
+try:
+    app.config["RENDITION_WORKERS"] = int(os.getenv("RENDITION_WORKERS", "2"))
+except Exception:
+    app.config["RENDITION_WORKERS"] = 2
+# Instrumentation: requests slower than SLOW_REQUEST_MS are logged with their SQL
+try:
+    app.config["SLOW_REQUEST_MS"] = int(os.getenv("SLOW_REQUEST_MS", "1000"))
+except Exception:
+    app.config["SLOW_REQUEST_MS"] = 1000
+# Orphan sweep: files younger than the grace period are kept, rows checked per query, and how often
+# the reaper runs the sweep by itself (0 = only through `flask storage-gc`)
+try:
+    app.config["GC_GRACE_SECONDS"] = int(os.getenv("GC_GRACE_SECONDS", "3600"))
+except Exception:
+    app.config["GC_GRACE_SECONDS"] = 3600
+try:
+    app.config["GC_BATCH_SIZE"] = int(os.getenv("GC_BATCH_SIZE", "500"))
+except Exception:
+    app.config["GC_BATCH_SIZE"] = 500
+try:
+    app.config["GC_INTERVAL_SECONDS"] = int(os.getenv("GC_INTERVAL_SECONDS", "0"))
+except Exception:
+    app.config["GC_INTERVAL_SECONDS"] = 0
+# Files released by a request that were touched this recently are checked again after the window,
+# which covers an upload of the same bytes that is between storing its file and committing
+try:
+    app.config["GC_INFLIGHT_SECONDS"] = int(os.getenv("GC_INFLIGHT_SECONDS", "10"))
+except Exception:
+    app.config["GC_INFLIGHT_SECONDS"] = 10
+# Live dashboard feed: off unless EVENTS_ENABLED is set, because each open dashboard holds a worker
+# thread (run gunicorn with threaded workers); events kept for reconnecting pages, and how long one
+# /events stream lasts
+app.config["EVENTS_ENABLED"] = (os.getenv("EVENTS_ENABLED") or "").strip().lower() in ["1", "true", "on"]
+try:
+    app.config["EVENTS_BUFFER"] = int(os.getenv("EVENTS_BUFFER", "1000"))
+except Exception:
+    app.config["EVENTS_BUFFER"] = 1000
+try:
+    app.config["EVENTS_STREAM_SECONDS"] = int(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+except Exception:
+    app.config["EVENTS_STREAM_SECONDS"] = 300
+# Batch uploads (/client/batch): request body limit for one batch, and files stored in parallel
+try:
+    app.config["BATCH_UPLOAD_MAX_LENGTH"] = int(os.getenv("BATCH_UPLOAD_MAX_LENGTH", str(100 * 1024 * 1024)))
+except Exception:
+    app.config["BATCH_UPLOAD_MAX_LENGTH"] = 100 * 1024 * 1024
+try:
+    app.config["BATCH_UPLOAD_WORKERS"] = int(os.getenv("BATCH_UPLOAD_WORKERS", "4"))
+except Exception:
+    app.config["BATCH_UPLOAD_WORKERS"] = 4
 _allowed_env = os.getenv("ALLOWED_EXTENSIONS")
 ALLOWED_EXTENSIONS = set([e.strip().lower() for e in _allowed_env.split(",")]) if _allowed_env else {"pdf", "png", "jpg", "jpeg"}
 
@@ -87,8 +205,33 @@ def format_local(dt, fmt="%Y-%m-%d %H:%M"):
 def localtime_filter(dt):
     return format_local(dt)
 
+def format_size(n):
+    if n is None:
+        return ""
+    for unit in ["B", "KB", "MB"]:
+        if n < 1024:
+            return ("%d %s" if unit == "B" else "%.1f %s") % (n, unit)
+        n /= 1024.0
+    return "%.1f GB" % n
+
+# Short file summary from the metadata stored at upload, e.g. "PDF · 3 صفحات · 1.2 MB"
+@app.template_filter("docmeta")
+def docmeta_filter(doc):
+    parts = []
+    if doc.mime_type:
+        parts.append(doc.mime_type.rsplit("/", 1)[-1].upper())
+    if doc.page_count:
+        parts.append("%d صفحات" % doc.page_count)
+    if doc.width and doc.height:
+        parts.append("%d×%d" % (doc.width, doc.height))
+    if doc.size_bytes is not None:
+        parts.append(format_size(doc.size_bytes))
+    return " · ".join(parts)
+
 @app.errorhandler(RequestEntityTooLarge)
 def handle_file_too_large(e):
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify({"error": "الملف أكبر من الحد المسموح"}), 413
     flash("الملف أكبر من الحد المسموح (20MB)")
     return redirect(request.referrer or url_for("client"))
 
@@ -96,25 +239,6 @@ db = SQLAlchemy(app)
 login_manager = LoginManager(app)
 login_manager.login_view = "login"
 
-# Automatic one-time rename of existing tables to new names
-def _rename_tables_if_needed():
-    try:
-        with db.engine.connect() as conn:
-            hr_users_exists = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema='public' AND table_name='hr_users')")).scalar()
-            user_exists = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema='public' AND table_name='user')")).scalar()
-            if not hr_users_exists and user_exists:
-                conn.execute(text('ALTER TABLE "user" RENAME TO hr_users'))
-            hr_docs_exists = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema='public' AND table_name='hr_documents')")).scalar()
-            doc_exists = conn.execute(text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema='public' AND table_name='document')")).scalar()
-            if not hr_docs_exists and doc_exists:
-                conn.execute(text("ALTER TABLE document RENAME TO hr_documents"))
-    except Exception:
-        # Non-fatal: app can still run; failures logged when DEBUG
-        if app.config.get("FLASK_ENV") == "development":
-            print("Table rename check failed")
-
-_rename_tables_if_needed()
-
 class User(UserMixin, db.Model):
     __tablename__ = "hr_users"
     id = db.Column(db.Integer, primary_key=True)
@@ -134,10 +258,998 @@ class Document(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     reviewed_at = db.Column(db.DateTime, nullable=True)
     reason = db.Column(db.Text, nullable=True)
+    # Content hash of the stored bytes (see Blob); NULL for legacy files stored flat under filename
+    blob_sha256 = db.Column(db.String(64), nullable=True, index=True)
+    # File facts recorded once at upload (see _ingest_metadata); NULL for rows not inspected yet
+    size_bytes = db.Column(db.BigInteger, nullable=True)
+    mime_type = db.Column(db.String(100), nullable=True)
+    width = db.Column(db.Integer, nullable=True)
+    height = db.Column(db.Integer, nullable=True)
+    page_count = db.Column(db.Integer, nullable=True)
+    # Access paths: client() by (user_id, doc_type), client_docs() by user_id ordered by created_at,
+    # latest_docs and the search API by (created_at desc, id desc); files()/preview use the primary key
+    __table_args__ = (
+        db.Index("ix_hr_documents_created_at_id", "created_at", "id"),
+        db.Index("ix_hr_documents_user_id_created_at", "user_id", "created_at"),
+        db.Index("ix_hr_documents_status_created_at", "status", "created_at"),
+        db.Index("ix_hr_documents_doc_type_status", "doc_type", "status"),
+        # One document per client and type: client() and uploads replace instead of adding
+        db.Index("uq_hr_documents_user_id_doc_type", "user_id", "doc_type", unique=True),
+    )
+
+class Blob(db.Model):
+    __tablename__ = "hr_blobs"
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UploadSession(db.Model):
+    __tablename__ = "hr_upload_sessions"
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("hr_users.id"), nullable=False, index=True)
+    doc_type = db.Column(db.String(50), nullable=True)
+    document_id = db.Column(db.Integer, nullable=True)  # set when replacing an existing document
+    filename = db.Column(db.String(200))
+    length = db.Column(db.BigInteger, nullable=False)
+    # Identifies the local file (the page sends its lastModified) so a different file with the same
+    # name and size never resumes this session's bytes
+    fingerprint = db.Column(db.String(64), nullable=True)
+    offset = db.Column(db.BigInteger, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Instrumentation: request latency, SQL statements per request and storage I/O are recorded in an
+# in-process registry and exported in Prometheus text format at /metrics. Every worker keeps its
+# own series, so scrape each worker (or sum them) rather than expecting one global view.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._families = {}
+
+    def define(self, name, kind, help, buckets=None):
+        self._families[name] = {"kind": kind, "help": help, "buckets": buckets, "series": {}}
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._families[name]["series"]
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        family = self._families[name]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = family["series"].get(key)
+            if counts is None:
+                # one slot per bucket, then the sum and the total count
+                counts = family["series"][key] = [0] * len(family["buckets"]) + [0.0, 0]
+            for i, bound in enumerate(family["buckets"]):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def render(self):
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join('%s="%s"' % (k, esc(v)) for k, v in pairs) + "}"
+        lines = []
+        with self._lock:
+            for name, family in self._families.items():
+                lines.append("# HELP %s %s" % (name, family["help"]))
+                lines.append("# TYPE %s %s" % (name, family["kind"]))
+                for labels, value in sorted(family["series"].items()):
+                    if family["kind"] == "counter":
+                        lines.append("%s%s %s" % (name, fmt(labels), value))
+                        continue
+                    for bound, count in zip(family["buckets"], value):
+                        lines.append("%s_bucket%s %d" % (name, fmt(labels, [("le", bound)]), count))
+                    lines.append("%s_bucket%s %d" % (name, fmt(labels, [("le", "+Inf")]), value[-1]))
+                    lines.append("%s_sum%s %s" % (name, fmt(labels), value[-2]))
+                    lines.append("%s_count%s %d" % (name, fmt(labels), value[-1]))
+        return "\n".join(lines) + "\n"
+
+metrics = _Metrics()
+metrics.define("hr_request_duration_seconds", "histogram", "Request latency by endpoint, method and status.", LATENCY_BUCKETS)
+metrics.define("hr_request_queries", "histogram", "SQL statements executed per request.", QUERY_COUNT_BUCKETS)
+metrics.define("hr_request_query_seconds", "histogram", "Time spent in SQL per request.", LATENCY_BUCKETS)
+metrics.define("hr_sql_query_duration_seconds", "histogram", "Duration of individual SQL statements.", LATENCY_BUCKETS)
+metrics.define("hr_storage_operation_seconds", "histogram", "Upload storage operations (store, store_chunk, remove, serve).", LATENCY_BUCKETS)
+metrics.define("hr_upload_bytes_total", "counter", "File bytes written to upload storage.")
+metrics.define("hr_request_bytes_total", "counter", "Request body bytes received by endpoint.")
+metrics.define("hr_response_bytes_total", "counter", "Response body bytes sent by endpoint (when the length is known).")
+metrics.define("hr_slow_requests_total", "counter", "Requests slower than SLOW_REQUEST_MS.")
+
+class _timed:
+    """Context manager recording the duration of a storage operation."""
+    def __init__(self, op):
+        self.op = op
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        metrics.observe("hr_storage_operation_seconds", time.perf_counter() - self.start, op=self.op)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _sql_started(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context, which is discarded with the statement, so a failed query
+    # (after_cursor_execute does not fire) leaves nothing behind on the pooled connection
+    if context is not None:
+        context._hr_query_start = time.perf_counter()
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "_hr_query_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    metrics.observe("hr_sql_query_duration_seconds", elapsed)
+    if has_request_context() and "sql" in g:
+        g.sql.append((elapsed, statement))
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql = []
+
+@app.after_request
+def _record_request(response):
+    if "request_start" not in g:
+        return response
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.endpoint or "unmatched"
+    metrics.observe("hr_request_duration_seconds", elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.observe("hr_request_queries", len(g.sql), endpoint=endpoint)
+    metrics.observe("hr_request_query_seconds", sum(t for t, _ in g.sql), endpoint=endpoint)
+    if request.content_length:
+        metrics.inc("hr_request_bytes_total", request.content_length, endpoint=endpoint)
+    if response.content_length:
+        metrics.inc("hr_response_bytes_total", response.content_length, endpoint=endpoint)
+    if elapsed * 1000 >= app.config["SLOW_REQUEST_MS"]:
+        metrics.inc("hr_slow_requests_total", endpoint=endpoint)
+        slowest = sorted(g.sql, key=lambda q: q[0], reverse=True)[:5]
+        app.logger.warning(
+            "Slow request %s %s -> %d in %.0f ms, %d queries (%.0f ms SQL)%s",
+            request.method, request.path, response.status_code, elapsed * 1000, len(g.sql), sum(t for t, _ in g.sql) * 1000,
+            "".join("\n  %.1f ms  %s" % (t * 1000, " ".join(sql.split())) for t, sql in slowest)
+        )
+    return response
+
+def _is_local_request():
+    # Behind a reverse proxy every request arrives from loopback; only trust it without forwarding headers
+    return request.remote_addr in ["127.0.0.1", "::1"] and not request.headers.get("X-Forwarded-For")
+
+@app.route("/metrics")
+def metrics_endpoint():
+    if not _is_local_request() and not (current_user.is_authenticated and current_user.role == "admin"):
+        return "Forbidden", 403
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# Content-addressed upload storage: every file is stored once under its SHA-256, sharded as
+# UPLOAD_FOLDER/ab/cd/<sha256>, and shared by all documents with the same bytes (ref_count).
+STORAGE_CHUNK_SIZE = 64 * 1024
+
+def _blob_path(sha256):
+    return os.path.join(app.config["UPLOAD_FOLDER"], sha256[:2], sha256[2:4], sha256)
+
+def _document_path(doc):
+    if doc.blob_sha256:
+        return _blob_path(doc.blob_sha256)
+    return os.path.join(app.config["UPLOAD_FOLDER"], doc.filename)
+
+def _store_stream(stream):
+    """Write a file stream into the blob store, hashing while copying; returns (sha256, size)."""
+    tmp_dir = os.path.join(app.config["UPLOAD_FOLDER"], ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with _timed("store"), open(tmp_path, "wb") as out:
+            while True:
+                chunk = stream.read(STORAGE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                out.write(chunk)
+        metrics.inc("hr_upload_bytes_total", size)
+        return _commit_blob_file(tmp_path, digest.hexdigest()), size
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _commit_blob_file(tmp_path, sha256):
+    """Move a fully written temp file to its content address; identical content is kept once."""
+    path = _blob_path(sha256)
+    if os.path.exists(path):
+        try:
+            # A fresh mtime keeps the reaper and the orphan sweep off a file this upload now reuses
+            os.utime(path)
+            os.remove(tmp_path)
+            return sha256
+        except FileNotFoundError:
+            pass  # removed in the meantime: store this copy instead
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return sha256
+
+def _acquire_blob(sha256, size):
+    # A single upsert, so two uploads of the same new file cannot both try to insert its row
+    dialect = postgresql if db.engine.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(Blob).values(sha256=sha256, size=size, ref_count=1, created_at=datetime.utcnow())
+    db.session.execute(stmt.on_conflict_do_update(index_elements=[Blob.sha256], set_={"ref_count": Blob.ref_count + 1}))
+
+def _release_blob(sha256, count=1):
+    """Drop references; a blob no longer used by any document is deleted and its file queued for removal."""
+    if not sha256:
+        return
+    Blob.query.filter_by(sha256=sha256).update({Blob.ref_count: Blob.ref_count - count}, synchronize_session=False)
+    if Blob.query.filter(Blob.sha256 == sha256, Blob.ref_count <= 0).delete(synchronize_session=False):
+        _remove_after_commit(shas=[sha256])
+
+# File removal never happens inside a request: callers register files with _remove_after_commit,
+# the list is handed to the reaper thread only when the transaction commits (and dropped on
+# rollback), and the reaper re-checks the database before deleting. Anything lost on the way
+# (crash, restart before the queue drained) is found later by the orphan sweep, `flask storage-gc`.
+_removal_queue = queue.Queue()
+_reaper_thread = None
+_reaper_lock = threading.Lock()
+
+def _remove_after_commit(paths=(), shas=()):
+    pending = db.session.info.setdefault("pending_removals", ([], []))
+    pending[0].extend(p for p in paths if p)
+    pending[1].extend(s for s in shas if s)
+
+@event.listens_for(Session, "after_commit")
+def _queue_pending_removals(session):
+    pending = session.info.pop("pending_removals", None)
+    if pending and (pending[0] or pending[1]):
+        _start_reaper()
+        _removal_queue.put(pending)
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_removals(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop("pending_removals", None)
+
+@app.before_request
+def _start_periodic_gc():
+    if app.config["GC_INTERVAL_SECONDS"] > 0 and _reaper_thread is None:
+        _start_reaper()
+
+def _start_reaper():
+    global _reaper_thread
+    with _reaper_lock:
+        if _reaper_thread is None or not _reaper_thread.is_alive():
+            _reaper_thread = threading.Thread(target=_reap, name="file-reaper", daemon=True)
+            _reaper_thread.start()
+
+def _reap():
+    last_gc = time.monotonic()
+    while True:
+        interval = app.config["GC_INTERVAL_SECONDS"]
+        try:
+            paths, shas = _removal_queue.get(timeout=interval if interval > 0 else None)
+        except queue.Empty:
+            paths, shas = None, None
+        with app.app_context():
+            try:
+                if paths is not None:
+                    _remove_unreferenced_files(paths, shas)
+                if interval > 0 and time.monotonic() - last_gc >= interval:
+                    last_gc = time.monotonic()
+                    collect_orphans()
+            except Exception as e:
+                app.logger.warning("File reaper failed: %s", e)
+            finally:
+                db.session.remove()
+
+def _remove_blob_file(sha256, cutoff):
+    """Delete a blob file unless a blob row (re)appeared or it was used after cutoff; returns the bytes freed."""
+    path = _blob_path(sha256)
+    trash = path + ".del"
+    if db.session.get(Blob, sha256) is not None:
+        return 0
+    # Move aside first, then check again. An upload of the same bytes that committed in between
+    # gets its file back. One still in flight either touched the file before the move (recent
+    # mtime, kept) or no longer finds it and stores its own copy
+    try:
+        size = os.path.getsize(path)
+        os.replace(path, trash)
+    except OSError:
+        return 0
+    if os.path.getmtime(trash) > cutoff or db.session.get(Blob, sha256) is not None:
+        try:
+            os.replace(trash, path)
+        except OSError as e:
+            app.logger.warning("Could not restore blob file %s: %s", path, e)
+        return 0
+    with _timed("remove"):
+        os.remove(trash)
+    _drop_renditions(sha256)
+    return size
+
+def _remove_unreferenced_files(doc_paths, shas):
+    """Reaper side: delete released blobs that nothing re-acquired, and legacy flat files no document uses."""
+    window = app.config["GC_INFLIGHT_SECONDS"]
+    recent = []
+    for sha256 in set(shas):
+        if not _remove_blob_file(sha256, time.time() - window) and os.path.exists(_blob_path(sha256)) and db.session.get(Blob, sha256) is None:
+            recent.append(sha256)
+    if recent:
+        # Touched by an upload that may still commit: look again once the window has passed
+        retry = threading.Timer(window, _removal_queue.put, (([], recent),))
+        retry.daemon = True
+        retry.start()
+    for path in set(doc_paths):
+        if Document.query.filter(Document.blob_sha256.is_(None), Document.filename == os.path.basename(path)).first():
+            continue
+        try:
+            with _timed("remove"):
+                os.remove(path)
+        except OSError:
+            pass
+
+# Upload ingest: the type of an upload is taken from its leading bytes, not its name, and the
+# size, type, image dimensions and PDF page count are stored on the Document once, so serving,
+# previews and the dashboards read columns instead of opening or guessing about the file.
+SNIFF_BYTES = 1024
+FILE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
+SIGNATURE_EXTENSIONS = {"application/pdf": {"pdf"}, "image/png": {"png"}, "image/jpeg": {"jpg", "jpeg"}, "image/gif": {"gif"}, "image/webp": {"webp"}}
+
+def _sniff_mime(head):
+    """MIME type recognized from a file's first bytes, or None."""
+    # PDF readers accept the header anywhere in the first kilobyte
+    if b"%PDF-" in head[:SNIFF_BYTES]:
+        return "application/pdf"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+def _upload_mime(head, filename):
+    """Type to record for an upload, or None when it must be refused.
+
+    Content with a known signature has to be one of the allowed types whatever its name says.
+    Extensions added through ALLOWED_EXTENSIONS that have no signature to check keep the type
+    their name implies.
+    """
+    mime = _sniff_mime(head)
+    if mime:
+        return mime if SIGNATURE_EXTENSIONS[mime] & ALLOWED_EXTENSIONS else None
+    ext = filename.rsplit(".", 1)[1].lower() if "." in filename else ""
+    if ext in ALLOWED_EXTENSIONS and not any(ext in exts for exts in SIGNATURE_EXTENSIONS.values()):
+        return mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    return None
+
+def _sniff_upload(f):
+    """_upload_mime for a FileStorage; the stream is rewound for storing."""
+    head = f.stream.read(SNIFF_BYTES)
+    f.stream.seek(0)
+    return _upload_mime(head, f.filename)
+
+def _file_metadata(path, mime):
+    """(width, height, page_count) of a stored file; None where it does not apply or cannot be read."""
+    try:
+        if mime.startswith("image/") and Image is not None:
+            with Image.open(path) as img:  # parses the header only
+                width, height = img.size
+                # EXIF orientations 5-8 are displayed turned by 90 degrees
+                if img.getexif().get(0x0112) in (5, 6, 7, 8):
+                    width, height = height, width
+                return width, height, None
+        if mime == "application/pdf" and pymupdf is not None:
+            with _pymupdf_lock, pymupdf.open(path, filetype="pdf") as pdf:
+                return None, None, pdf.page_count
+        if mime == "application/pdf" and shutil.which("pdfinfo"):
+            out = subprocess.run(["pdfinfo", path], check=True, capture_output=True, text=True, timeout=30).stdout
+            pages = [line.split(":", 1)[1] for line in out.splitlines() if line.startswith("Pages:")]
+            return None, None, int(pages[0]) if pages else None
+    except Exception as e:
+        app.logger.warning("Could not read metadata of %s: %s", path, e)
+    return None, None, None
+
+def _attach_blob(doc, sha256, size, filename, mime):
+    """Point doc at a stored blob (a replaced document goes back to review); the old file goes after commit."""
+    if doc.id is not None and not doc.blob_sha256 and doc.filename:
+        _remove_after_commit(paths=[os.path.join(app.config["UPLOAD_FOLDER"], doc.filename)])
+    _acquire_blob(sha256, size)
+    _release_blob(doc.blob_sha256)
+    doc.blob_sha256 = sha256
+    doc.filename = secure_filename(filename) or sha256
+    doc.size_bytes, doc.mime_type = size, mime
+    doc.width, doc.height, doc.page_count = _file_metadata(_blob_path(sha256), mime)
+    if doc.id is not None:
+        doc.status = "pending"
+        doc.reviewed_at = None
+        doc.reason = None
+        doc.created_at = datetime.utcnow()
+
+def _attach_upload(doc, f, mime):
+    """Store an uploaded FileStorage of the sniffed type mime and point doc at it."""
+    sha256, size = _store_stream(f.stream)
+    _attach_blob(doc, sha256, size, f.filename, mime)
+
+# Orphan sweep: reconciles UPLOAD_FOLDER with hr_blobs/hr_documents in batches. Files younger than
+# GC_GRACE_SECONDS are never touched, which covers uploads that are stored but not yet committed.
+def _storage_files():
+    """(kind, key, path) for every file under UPLOAD_FOLDER that the app manages."""
+    root = app.config["UPLOAD_FOLDER"]
+    for entry in os.scandir(root):
+        if entry.is_file():
+            # Legacy flat uploads; other files (env.example, notes) are not ours to delete
+            if allowed_file(entry.name):
+                yield "legacy", entry.name, entry.path
+        elif entry.name in [".tmp", ".partial"]:
+            for sub in os.scandir(entry.path):
+                yield entry.name[1:], sub.name, sub.path
+        elif len(entry.name) == 2:
+            for shard in os.scandir(entry.path):
+                if shard.is_dir():
+                    for f in os.scandir(shard.path):
+                        yield ("trash", f.name[:-4], f.path) if f.name.endswith(".del") else ("blob", f.name, f.path)
+
+def _orphans(batch):
+    """The entries of one batch that no database row refers to."""
+    keys = lambda kind: [key for k, key, _ in batch if k == kind]
+    used = set()
+    if keys("blob"):
+        used.update(("blob", s) for (s,) in db.session.query(Blob.sha256).filter(Blob.sha256.in_(keys("blob"))))
+        used.update(("blob", s) for (s,) in db.session.query(Document.blob_sha256).filter(Document.blob_sha256.in_(keys("blob"))))
+    if keys("legacy"):
+        used.update(("legacy", n) for (n,) in db.session.query(Document.filename).filter(Document.blob_sha256.is_(None), Document.filename.in_(keys("legacy"))))
+    if keys("partial"):
+        used.update(("partial", i) for (i,) in db.session.query(UploadSession.id).filter(UploadSession.id.in_(keys("partial"))))
+    # .tmp files are never referenced, and stale ".del" leftovers are from an interrupted removal
+    return [(kind, key, path) for kind, key, path in batch if (kind, key) not in used]
+
+def collect_orphans(grace_seconds=None, batch_size=None, dry_run=False):
+    """Remove files no row refers to; returns counts and bytes freed."""
+    grace = app.config["GC_GRACE_SECONDS"] if grace_seconds is None else grace_seconds
+    batch_size = batch_size or app.config["GC_BATCH_SIZE"]
+    stats = {"scanned": 0, "removed": 0, "bytes": 0}
+    if db.engine.dialect.name == "postgresql":
+        # One sweep at a time across workers and cron; others skip this round
+        if not db.session.execute(text("SELECT pg_try_advisory_xact_lock(7300402)")).scalar():
+            return stats
+    cutoff = time.time() - grace
+    batch = []
+
+    def flush():
+        for kind, key, path in _orphans(batch):
+            try:
+                if os.path.getmtime(path) > cutoff:
+                    continue
+                if dry_run:
+                    freed = os.path.getsize(path)
+                elif kind == "blob":
+                    freed = _remove_blob_file(key, cutoff)
+                else:
+                    freed = os.path.getsize(path)
+                    with _timed("remove"):
+                        os.remove(path)
+            except OSError:
+                continue
+            if freed or kind != "blob":
+                stats["removed"] += 1
+                stats["bytes"] += freed
+        batch.clear()
+
+    for entry in _storage_files():
+        stats["scanned"] += 1
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    db.session.rollback()
+    if stats["removed"]:
+        app.logger.info("Orphan sweep removed %d files (%d bytes)", stats["removed"], stats["bytes"])
+    return stats
+
+@app.cli.command("storage-gc")
+@click.option("--grace", type=int, default=None, help="Skip files modified within this many seconds (default GC_GRACE_SECONDS).")
+@click.option("--batch", type=int, default=None, help="Files checked per database query (default GC_BATCH_SIZE).")
+@click.option("--dry-run", is_flag=True, help="Only report what would be removed.")
+def storage_gc(grace, batch, dry_run):
+    """Remove upload files that no document, blob or upload session refers to."""
+    stats = collect_orphans(grace, batch, dry_run)
+    click.echo("%s %d of %d files (%d bytes)" % ("would remove" if dry_run else "removed", stats["removed"], stats["scanned"], stats["bytes"]))
+
+# Renditions: a first-page/downscaled JPEG "preview" and a small "thumb" per blob, rendered by a
+# background pool after upload. They are keyed by content hash, so a replaced document simply
+# gets new ones; the old ones are dropped with their blob and the cache is trimmed by age.
+RENDITION_SIZES = {"thumb": 240, "preview": 1400}
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # renditions are optional; documents are then previewed from the original
+    Image = None
+try:
+    import pymupdf  # optional (AGPL): without it PDFs go through poppler's pdftoppm/pdfinfo
+except ImportError:
+    pymupdf = None
+# PyMuPDF is not thread-safe; the rendition pool and request threads take turns
+_pymupdf_lock = threading.Lock()
+
+_rendition_executor = None
+_rendition_pending = set()
+_rendition_lock = threading.Lock()
+_rendition_cache_bytes = None
+
+def _rendition_path(sha256, kind):
+    return os.path.join(app.config["RENDITION_FOLDER"], kind, sha256[:2], sha256 + ".jpg")
+
+def _drop_renditions(sha256):
+    for kind in RENDITION_SIZES:
+        try:
+            os.remove(_rendition_path(sha256, kind))
+        except OSError:
+            pass
+
+def _load_first_page(path, mime, size):
+    """First page or the image itself as an RGB PIL image no larger than size, or None."""
+    if mime and mime.startswith("image/"):
+        img = Image.open(path)
+        img.draft("RGB", (size, size))  # lets JPEG decode at reduced scale
+        img = ImageOps.exif_transpose(img).convert("RGB")
+        img.thumbnail((size, size))
+        return img
+    if mime == "application/pdf":
+        if pymupdf is not None:
+            with _pymupdf_lock, pymupdf.open(path) as pdf:
+                if pdf.page_count == 0:
+                    return None
+                page = pdf[0]
+                zoom = size / max(page.rect.width, page.rect.height, 1)
+                pix = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+                return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        if shutil.which("pdftoppm"):
+            with tempfile.TemporaryDirectory() as tmp:
+                out = os.path.join(tmp, "page")
+                subprocess.run(["pdftoppm", "-jpeg", "-f", "1", "-l", "1", "-scale-to", str(size), "-singlefile", path, out], check=True, capture_output=True, timeout=60)
+                with Image.open(out + ".jpg") as img:
+                    return img.convert("RGB")
+    return None
+
+def _render_renditions(sha256, mime, source_path):
+    try:
+        img = _load_first_page(source_path, mime, RENDITION_SIZES["preview"])
+        if img is None:
+            return
+        written = 0
+        for kind in ["preview", "thumb"]:
+            if kind == "thumb":
+                img.thumbnail((RENDITION_SIZES["thumb"], RENDITION_SIZES["thumb"]))
+            path = _rendition_path(sha256, kind)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = path + "." + uuid.uuid4().hex + ".tmp"
+            img.save(tmp_path, "JPEG", quality=80, optimize=True)
+            os.replace(tmp_path, path)
+            written += os.path.getsize(path)
+        _account_rendition_bytes(written)
+    except Exception as e:
+        app.logger.warning("Rendition failed for %s: %s", sha256, e)
+    finally:
+        with _rendition_lock:
+            _rendition_pending.discard(sha256)
+
+def _account_rendition_bytes(added):
+    """Track the cache size and evict the least recently used files when it exceeds the limit."""
+    global _rendition_cache_bytes
+    root = app.config["RENDITION_FOLDER"]
+    limit = app.config["RENDITION_CACHE_MAX_BYTES"]
+    with _rendition_lock:
+        if _rendition_cache_bytes is not None:
+            _rendition_cache_bytes += added
+            if _rendition_cache_bytes <= limit:
+                return
+        entries = []
+        total = 0
+        # A .tmp file is a rendition still being written; only leftovers of a crashed render may go
+        stale = time.time() - app.config["GC_GRACE_SECONDS"]
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                total += st.st_size
+                if name.endswith(".tmp") and st.st_mtime > stale:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        if total > limit:
+            # Trim to 90% so a busy cache does not rescan on every new rendition
+            for _, size, path in sorted(entries):
+                if total <= limit * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+        _rendition_cache_bytes = total
+
+def _schedule_renditions(doc):
+    """Queue rendition work for a committed document; no-op when it exists or is in flight."""
+    global _rendition_executor
+    if Image is None or not doc.blob_sha256:
+        return
+    sha256 = doc.blob_sha256
+    mime = doc.mime_type or mimetypes.guess_type(doc.filename or "")[0]
+    if os.path.exists(_rendition_path(sha256, "thumb")):
+        return
+    with _rendition_lock:
+        if sha256 in _rendition_pending:
+            return
+        _rendition_pending.add(sha256)
+        if _rendition_executor is None:
+            _rendition_executor = ThreadPoolExecutor(max_workers=app.config["RENDITION_WORKERS"], thread_name_prefix="renditions")
+    _rendition_executor.submit(_render_renditions, sha256, mime, _blob_path(sha256))
+
+@app.cli.command("renditions-build")
+def renditions_build():
+    """Queue renditions for every stored document that does not have them yet."""
+    seen = set()
+    for doc in Document.query.filter(Document.blob_sha256.isnot(None)).all():
+        if doc.blob_sha256 not in seen:
+            seen.add(doc.blob_sha256)
+            _schedule_renditions(doc)
+    if _rendition_executor is not None:
+        _rendition_executor.shutdown(wait=True)
+    click.echo("checked %d blobs" % len(seen))
+
+# Session user cache: load_user() runs on every authenticated request, so it answers from a
+# TTL/LRU cache of the few fields current_user needs. Entries are dropped explicitly when an
+# account changes; with USER_CACHE_REDIS_URL the cache is shared and invalidation reaches
+# every worker at once, otherwise other workers converge within USER_CACHE_TTL (a few seconds by
+# default; immediate revocation across workers needs Redis).
+class SessionUser(UserMixin):
+    """Detached snapshot of a User for current_user."""
+    def __init__(self, id, email, name, role):
+        self.id = id
+        self.email = email
+        self.name = name
+        self.role = role
+
+class _UserCache:
+    def __init__(self, ttl, size, redis_url=None):
+        self.ttl = ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        if redis_url:
+            try:
+                import redis
+                self._redis = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+            except ImportError:
+                app.logger.warning("USER_CACHE_REDIS_URL is set but the redis package is not installed")
+
+    def get(self, user_id):
+        if self._redis is not None:
+            try:
+                raw = self._redis.get("hr:user:%d" % user_id)
+                return json.loads(raw) if raw else None
+            except Exception:
+                return None
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def set(self, user_id, fields):
+        if self._redis is not None:
+            try:
+                self._redis.setex("hr:user:%d" % user_id, self.ttl, json.dumps(fields))
+            except Exception:
+                pass
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, fields)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        if self._redis is not None:
+            try:
+                self._redis.delete("hr:user:%d" % user_id)
+            except Exception:
+                app.logger.warning("Could not invalidate cached user %s", user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+user_cache = _UserCache(app.config["USER_CACHE_TTL"], app.config["USER_CACHE_SIZE"], app.config["USER_CACHE_REDIS_URL"])
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    try:
+        user_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    fields = user_cache.get(user_id)
+    if fields is None:
+        u = db.session.get(User, user_id)
+        if u is None:
+            return None
+        fields = {"email": u.email, "name": u.name, "role": u.role}
+        user_cache.set(user_id, fields)
+    return SessionUser(user_id, fields["email"], fields["name"], fields["role"])
+
+# Server-side search shared by the dashboards and /api/*: filters are applied in SQL and
+# results are paged with keyset cursors so no view ever loads the full dataset.
+def _parse_search_filters(args):
+    filters = {}
+    q = (args.get("q") or "").strip()
+    if q:
+        filters["q"] = q
+    doc_type = (args.get("doc_type") or "").strip()
+    if doc_type:
+        if doc_type not in DOC_TYPE_LABELS:
+            raise ValueError("invalid doc_type")
+        filters["doc_type"] = doc_type
+    status = (args.get("status") or "").strip()
+    if status:
+        if status not in ["pending", "approved", "rejected"]:
+            raise ValueError("invalid status")
+        filters["status"] = status
+    for key in ["date_from", "date_to"]:
+        value = (args.get(key) or "").strip()
+        if value:
+            try:
+                filters[key] = datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                raise ValueError("invalid " + key)
+    return filters
+
+def _page_limit(args):
+    default = app.config.get("SEARCH_PAGE_SIZE", 25)
+    try:
+        limit = int(args.get("limit") or default)
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, 100))
+
+def _filter_documents(query, filters):
+    if filters.get("doc_type"):
+        query = query.filter(Document.doc_type == filters["doc_type"])
+    if filters.get("status"):
+        query = query.filter(Document.status == filters["status"])
+    if filters.get("date_from"):
+        query = query.filter(Document.created_at >= filters["date_from"])
+    if filters.get("date_to"):
+        query = query.filter(Document.created_at < filters["date_to"] + timedelta(days=1))
+    return query
+
+def _filter_users(query, filters):
+    if filters.get("q"):
+        pattern = "%" + filters["q"].replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.filter(or_(User.name.ilike(pattern, escape="\\"), User.email.ilike(pattern, escape="\\")))
+    return query
+
+def _clients_query(filters, cursor=None):
+    def status_count(status):
+        return func.sum(case((Document.status == status, 1), else_=0))
+    query = db.session.query(
+        User.id,
+        User.name,
+        User.email,
+        func.count(Document.id).label("file_count"),
+        func.max(Document.created_at).label("last_upload"),
+        status_count("pending").label("pending_count"),
+        status_count("approved").label("approved_count"),
+        status_count("rejected").label("rejected_count")
+    ).join(Document, Document.user_id == User.id)
+    query = _filter_users(_filter_documents(query, filters), filters)
+    if cursor:
+        try:
+            query = query.filter(User.id < int(cursor))
+        except ValueError:
+            raise ValueError("invalid cursor")
+    # Grouping by the primary key alone lets the planner walk hr_users in id order and stop at the page
+    return query.group_by(User.id).order_by(User.id.desc())
+
+def _client_item(row):
+    return {
+        "id": row.id,
+        "name": row.name or row.email,
+        "email": row.email,
+        "file_count": row.file_count,
+        "last_upload": row.last_upload,
+        "pending_count": row.pending_count or 0,
+        "approved_count": row.approved_count or 0,
+        "rejected_count": row.rejected_count or 0
+    }
+
+def _search_clients(filters, cursor=None, limit=25):
+    """Clients with matching documents, newest account first; cursor is the last user id."""
+    rows = _clients_query(filters, cursor).limit(limit + 1).all()
+    items = [_client_item(row) for row in rows[:limit]]
+    next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+def _document_cursor(d):
+    return "%s_%d" % (d.created_at.strftime("%Y%m%d%H%M%S%f"), d.id)
+
+def _documents_query(filters, cursor=None):
+    query = _filter_documents(Document.query.options(joinedload(Document.user)), filters)
+    if filters.get("q"):
+        query = _filter_users(query.join(User, Document.user_id == User.id), filters)
+    if cursor:
+        try:
+            ts, last_id = cursor.rsplit("_", 1)
+            last_id = int(last_id)
+            ts = datetime.strptime(ts, "%Y%m%d%H%M%S%f")
+        except ValueError:
+            raise ValueError("invalid cursor")
+        query = query.filter(or_(Document.created_at < ts, and_(Document.created_at == ts, Document.id < last_id)))
+    # Matches ix_hr_documents_created_at_id read backwards (created_at is backfilled, never NULL)
+    return query.order_by(Document.created_at.desc(), Document.id.desc())
+
+def _search_documents(filters, cursor=None, limit=25):
+    """Documents newest first (created_at desc, id desc); cursor encodes the last row's key."""
+    docs = _documents_query(filters, cursor).limit(limit + 1).all()
+    next_cursor = _document_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+def _client_json(ci):
+    return {
+        "id": ci["id"],
+        "name": ci["name"],
+        "email": ci["email"],
+        "file_count": ci["file_count"],
+        "pending_count": ci["pending_count"],
+        "approved_count": ci["approved_count"],
+        "rejected_count": ci["rejected_count"],
+        "last_upload": ci["last_upload"].isoformat() if ci["last_upload"] else None,
+        "last_upload_local": format_local(ci["last_upload"]),
+        "url": url_for("client_docs", user_id=ci["id"])
+    }
+
+def _document_json(d):
+    return {
+        "id": d.id,
+        "user_id": d.user_id,
+        "user_name": (d.user.name or d.user.email) if d.user else None,
+        "doc_type": d.doc_type,
+        "doc_type_label": DOC_TYPE_LABELS.get(d.doc_type, "—"),
+        "filename": d.filename,
+        "size_bytes": d.size_bytes,
+        "mime_type": d.mime_type,
+        "width": d.width,
+        "height": d.height,
+        "page_count": d.page_count,
+        "meta": docmeta_filter(d),
+        "status": d.status,
+        "reason": d.reason,
+        "created_at": d.created_at.isoformat() if d.created_at else None,
+        "created_at_local": format_local(d.created_at),
+        "reviewed_at": d.reviewed_at.isoformat() if d.reviewed_at else None,
+        "download_url": url_for("files", id=d.id, v=d.blob_sha256),
+        "preview_url": url_for("preview_file", id=d.id, v=d.blob_sha256),
+        "thumb_url": url_for("rendition", id=d.id, kind="thumb", v=d.blob_sha256) if d.blob_sha256 else None,
+        "rendition_url": url_for("rendition", id=d.id, kind="preview", v=d.blob_sha256) if d.blob_sha256 else None,
+        "approve_url": url_for("review", id=d.id, status="approved"),
+        "reject_url": url_for("review_reject", id=d.id)
+    }
+
+# Dashboard summary shared by admin() and supervisor(): first page of the clients table and
+# the latest uploads, each a single bounded query; further pages come from /api/clients.
+def _dashboard_summary(latest_limit=10):
+    clients_info, clients_cursor = _search_clients({}, limit=app.config.get("SEARCH_PAGE_SIZE", 25))
+    latest_docs, _ = _search_documents({}, limit=latest_limit)
+    return {"clients_info": clients_info, "clients_cursor": clients_cursor, "latest_docs": latest_docs}
+
+# Live dashboards: routes that change documents publish an event after their commit, and /events
+# streams them to open admin/supervisor pages (Server-Sent Events), which update the affected
+# rows in place instead of reloading. The feed is in-process: a page only hears about changes
+# made through the worker it is connected to, and catches up with a full reload after a reset.
+class _ChangeFeed:
+    def __init__(self, size):
+        self.epoch = uuid.uuid4().hex[:8]  # event ids from an earlier process cannot be resumed
+        self._events = deque(maxlen=size)
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, events):
+        if not events:
+            return
+        with self._cond:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+            self._cond.notify_all()
+
+    def resume_from(self, last_event_id):
+        """Sequence to continue after, or None when events since last_event_id are gone."""
+        with self._cond:
+            if not last_event_id:
+                return self._seq
+            epoch, _, seq = last_event_id.partition("-")
+            try:
+                seq = int(seq)
+            except ValueError:
+                return None
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            if epoch != self.epoch or seq > self._seq or seq < oldest - 1:
+                return None
+            return seq
+
+    def wait(self, after, timeout):
+        with self._cond:
+            if self._seq <= after:
+                self._cond.wait(timeout)
+            return [(seq, event) for seq, event in self._events if seq > after]
+
+change_feed = _ChangeFeed(app.config["EVENTS_BUFFER"])
+
+def _document_events(kind, docs):
+    """Feed events for docs (created, replaced or reviewed) with their clients' updated counts.
+
+    Built inside the transaction, before commit, and published by the caller once it commits.
+    """
+    if not app.config["EVENTS_ENABLED"]:
+        return []
+    db.session.flush()
+    user_ids = {d.user_id for d in docs}
+    clients = {row.id: _client_json(_client_item(row)) for row in _clients_query({}).filter(User.id.in_(user_ids))}
+    return [{"type": kind, "document": _document_json(d), "client": clients.get(d.user_id)} for d in docs]
+
+@app.route("/events")
+@login_required
+def events():
+    if current_user.role not in ["admin", "supervisor"]:
+        return "Forbidden", 403
+    if not app.config["EVENTS_ENABLED"]:
+        # 204 tells EventSource to stop reconnecting
+        return "", 204
+    after = change_feed.resume_from(request.headers.get("Last-Event-ID"))
+    # Hold no database connection for the lifetime of the stream
+    db.session.remove()
+
+    def stream(after):
+        yield "retry: 3000\n\n"
+        if after is None:
+            # Missed events cannot be replayed; the page reloads its tables instead
+            after = change_feed.resume_from(None)
+            yield "id: %s-%d\nevent: reset\ndata: {}\n\n" % (change_feed.epoch, after)
+        # Streams end after EVENTS_STREAM_SECONDS so workers are recycled; EventSource reconnects
+        deadline = time.monotonic() + app.config["EVENTS_STREAM_SECONDS"]
+        while time.monotonic() < deadline:
+            batch = change_feed.wait(after, timeout=15)
+            if not batch:
+                yield ": keepalive\n\n"
+                continue
+            for seq, event in batch:
+                after = seq
+                yield "id: %s-%d\nevent: document\ndata: %s\n\n" % (change_feed.epoch, seq, json.dumps(event, ensure_ascii=False))
+
+    resp = app.response_class(stream_with_context(stream(after)), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
 
 @app.route("/", methods=["GET","POST"])
 def login():
@@ -176,41 +1288,30 @@ def client():
         if not f or not f.filename or f.filename.strip() == "":
             flash("يجب اختيار ملف")
             return redirect(request.form.get("next") or request.referrer or url_for("client"))
-        if not allowed_file(f.filename):
+        mime = _sniff_upload(f) if allowed_file(f.filename) else None
+        if not mime:
             flash("الرجاء رفع ملف بصيغة مسموحة: PDF أو صورة (PNG, JPG, JPEG)")
             return redirect(request.form.get("next") or request.referrer or url_for("client"))
-        name = secure_filename(f.filename)
-        path = os.path.join(app.config["UPLOAD_FOLDER"], name)
         # If user already has a document for this type, replace it
         existing = Document.query.filter_by(user_id=current_user.id, doc_type=doc_type).first()
-        if existing:
-            try:
-                old_path = os.path.join(app.config["UPLOAD_FOLDER"], existing.filename)
-                if os.path.exists(old_path):
-                    os.remove(old_path)
-            except Exception:
-                pass
-            f.save(path)
-            existing.filename = name
-            existing.status = "pending"
-            existing.reviewed_at = None
-            existing.reason = None
-            existing.created_at = datetime.utcnow()
-            db.session.commit()
-            flash("تم استبدال الملف بنجاح")
-        else:
-            f.save(path)
-            d = Document(user_id=current_user.id, doc_type=doc_type, filename=name)
+        d = existing or Document(user_id=current_user.id, doc_type=doc_type)
+        _attach_upload(d, f, mime)
+        if not existing:
             db.session.add(d)
-            db.session.commit()
-            flash("تم رفع الملف بنجاح")
+        feed_events = _document_events("replaced" if existing else "created", [d])
+        db.session.commit()
+        change_feed.publish(feed_events)
+        _schedule_renditions(d)
+        flash("تم استبدال الملف بنجاح" if existing else "تم رفع الملف بنجاح")
     # Build mapping of docs by type for this client
     docs = Document.query.filter_by(user_id=current_user.id).all()
     docs_by_type = {}
     for d in docs:
         if d.doc_type:
             docs_by_type[d.doc_type] = d
-    return render_template("client.html", docs=docs, required_docs=REQUIRED_DOCS, docs_by_type=docs_by_type)
+    # Types still to be sent (missing or rejected) are offered in the batch upload form
+    batch_docs = [doc for doc in REQUIRED_DOCS if doc["key"] not in docs_by_type or docs_by_type[doc["key"]].status == "rejected"]
+    return render_template("client.html", docs=docs, required_docs=REQUIRED_DOCS, docs_by_type=docs_by_type, batch_docs=batch_docs)
 
 @app.route("/client/docs/<int:id>/replace", methods=["POST"], endpoint="client_replace")
 @login_required
@@ -224,28 +1325,313 @@ def client_replace(id):
     if not f or f.filename.strip() == "":
         flash("يجب اختيار ملف")
         return redirect(request.form.get("next") or request.referrer or url_for("client"))
-    if not allowed_file(f.filename):
+    mime = _sniff_upload(f) if allowed_file(f.filename) else None
+    if not mime:
         flash("الرجاء رفع ملف بصيغة مسموحة: PDF أو صورة (PNG, JPG, JPEG)")
         return redirect(request.form.get("next") or request.referrer or url_for("client"))
-    name = secure_filename(f.filename)
-    new_path = os.path.join(app.config["UPLOAD_FOLDER"], name)
-    try:
-        old_path = os.path.join(app.config["UPLOAD_FOLDER"], d.filename)
-        if os.path.exists(old_path):
-            os.remove(old_path)
-    except Exception:
-        pass
-    f.save(new_path)
-    d.filename = name
-    d.status = "pending"
-    d.reviewed_at = None
-    d.reason = None
-    d.created_at = datetime.utcnow()
+    _attach_upload(d, f, mime)
+    feed_events = _document_events("replaced", [d])
     db.session.commit()
+    change_feed.publish(feed_events)
+    _schedule_renditions(d)
     flash("تم إعادة رفع الملف")
     next_url = request.form.get("next") or request.referrer or url_for("client")
     return redirect(next_url)
 
+# Batch upload: many (doc_type, file) pairs in one request, sent as file_<doc_type> fields or as
+# repeated doc_type/file pairs. One query finds the documents being replaced, the files are stored
+# and hashed on a small thread pool (their metadata is read afterwards, one file at a time), and
+# all documents are committed in one transaction. The answer is a result per file (JSON, for the
+# client page) or a flash summary.
+def _batch_upload_pairs():
+    pairs = [(key[len("file_"):], f) for key, f in request.files.items(multi=True) if key.startswith("file_")]
+    pairs += list(zip(request.form.getlist("doc_type"), request.files.getlist("file")))
+    # Browsers send file inputs left empty as parts without a filename
+    return [(doc_type.strip(), f) for doc_type, f in pairs if f and f.filename]
+
+@app.route("/client/batch", methods=["POST"])
+@login_required
+def client_batch():
+    wants_json = request.accept_mimetypes.best == "application/json"
+    if current_user.role != "client":
+        return (jsonify({"error": "forbidden"}), 403) if wants_json else "Forbidden"
+    # Several documents share one request body, so it gets its own limit (set before form parsing)
+    request.max_content_length = app.config["BATCH_UPLOAD_MAX_LENGTH"]
+    next_url = request.form.get("next") or url_for("client")
+    results, accepted = [], []
+    for doc_type, f in _batch_upload_pairs():
+        result = {"doc_type": doc_type, "filename": f.filename}
+        mime = _sniff_upload(f) if allowed_file(f.filename) else None
+        if doc_type not in DOC_TYPE_LABELS:
+            result["error"] = "invalid doc_type"
+        elif any(a[1] == doc_type for a in accepted):
+            result["error"] = "duplicate doc_type"
+        elif not mime:
+            result["error"] = "unsupported file type"
+        else:
+            accepted.append((result, doc_type, f, mime))
+        result["ok"] = "error" not in result
+        results.append(result)
+    if not results:
+        if wants_json:
+            return jsonify({"error": "no files"}), 400
+        flash("يجب اختيار ملف")
+        return redirect(next_url)
+    created, replaced = [], []
+    if accepted:
+        existing = {d.doc_type: d for d in Document.query.filter(Document.user_id == current_user.id, Document.doc_type.in_([a[1] for a in accepted]))}
+        with ThreadPoolExecutor(max_workers=min(app.config["BATCH_UPLOAD_WORKERS"], len(accepted))) as pool:
+            stored = list(pool.map(lambda a: _store_stream(a[2].stream), accepted))
+        for (result, doc_type, f, mime), (sha256, size) in zip(accepted, stored):
+            d = existing.get(doc_type)
+            result["replaced"] = d is not None
+            if d is None:
+                d = Document(user_id=current_user.id, doc_type=doc_type)
+                created.append(d)
+            else:
+                replaced.append(d)
+            _attach_blob(d, sha256, size, f.filename, mime)
+            if not result["replaced"]:
+                db.session.add(d)
+        feed_events = (_document_events("created", created) if created else []) + (_document_events("replaced", replaced) if replaced else [])
+        # Built before commit expires the rows
+        db.session.flush()
+        documents = {d.doc_type: _document_json(d) for d in created + replaced}
+        db.session.commit()
+        change_feed.publish(feed_events)
+        for d in created + replaced:
+            _schedule_renditions(d)
+        for result, doc_type, _, _ in accepted:
+            result["document"] = documents[doc_type]
+    failed = [r for r in results if not r["ok"]]
+    if wants_json:
+        return jsonify({"created": len(created), "replaced": len(replaced), "failed": len(failed), "results": results})
+    message = "تم رفع %d ملف" % (len(created) + len(replaced))
+    if failed:
+        message += "، وتعذر رفع %d: " % len(failed) + "، ".join("%s (%s)" % (DOC_TYPE_LABELS.get(r["doc_type"], r["doc_type"]), r["error"]) for r in failed[:5])
+    flash(message)
+    return redirect(next_url)
+
+# Resumable chunked uploads (tus-style): POST creates or resumes a session, HEAD reports the
+# committed offset, PATCH appends one chunk at that offset, and the last chunk commits the
+# Document. Chunks are streamed to UPLOAD_FOLDER/.partial with constant memory.
+_upload_hashers = {}
+_upload_hashers_lock = threading.Lock()
+
+def _partial_path(upload_id):
+    return os.path.join(app.config["UPLOAD_FOLDER"], ".partial", upload_id)
+
+def _upload_hasher(session):
+    """SHA-256 state for the committed bytes; rebuilt from disk when another worker wrote them."""
+    with _upload_hashers_lock:
+        cached = _upload_hashers.pop(session.id, None)
+    if cached and cached[0] == session.offset:
+        return cached[1]
+    digest = hashlib.sha256()
+    remaining = session.offset
+    if remaining:
+        with open(_partial_path(session.id), "rb") as fh:
+            while remaining > 0:
+                chunk = fh.read(min(STORAGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+    return digest
+
+def _discard_upload_session(session):
+    with _upload_hashers_lock:
+        _upload_hashers.pop(session.id, None)
+    try:
+        os.remove(_partial_path(session.id))
+    except OSError:
+        pass
+    db.session.delete(session)
+
+def _upload_json(session, **extra):
+    data = {"id": session.id, "offset": session.offset, "length": session.length, "url": url_for("upload_status", upload_id=session.id), "chunk_size": app.config["UPLOAD_CHUNK_SIZE"]}
+    data.update(extra)
+    return data
+
+def _get_upload_session(upload_id):
+    session = db.session.get(UploadSession, upload_id)
+    if session is None or session.user_id != current_user.id:
+        return None
+    if not os.path.exists(_partial_path(session.id)):
+        # The received bytes are gone (interrupted finalize, manual cleanup): resume from zero
+        session.offset = 0
+        os.makedirs(os.path.dirname(_partial_path(session.id)), exist_ok=True)
+        open(_partial_path(session.id), "wb").close()
+        db.session.commit()
+    return session
+
+@app.route("/uploads", methods=["POST"])
+@login_required
+def upload_create():
+    if current_user.role != "client":
+        return jsonify({"error": "forbidden"}), 403
+    data = request.get_json(silent=True) or request.form
+    filename = (data.get("filename") or "").strip()
+    doc_type = (data.get("doc_type") or "").strip()
+    fingerprint = str(data.get("fingerprint") or "").strip()[:64] or None
+    document_id = data.get("document_id")
+    try:
+        length = int(data.get("length"))
+        document_id = int(document_id) if document_id else None
+    except (TypeError, ValueError):
+        return jsonify({"error": "invalid length"}), 400
+    if not filename or not allowed_file(filename):
+        return jsonify({"error": "الرجاء رفع ملف بصيغة مسموحة: PDF أو صورة (PNG, JPG, JPEG)"}), 400
+    if length <= 0 or length > app.config["UPLOAD_MAX_LENGTH"]:
+        return jsonify({"error": "الملف أكبر من الحد المسموح"}), 413
+    if document_id:
+        d = db.session.get(Document, document_id)
+        if d is None or d.user_id != current_user.id:
+            return jsonify({"error": "forbidden"}), 403
+        doc_type = d.doc_type
+    elif doc_type not in DOC_TYPE_LABELS:
+        return jsonify({"error": "الرجاء اختيار نوع مستند صالح"}), 400
+    # Expire abandoned sessions of this user, then resume a matching one if it is still there
+    cutoff = datetime.utcnow() - timedelta(hours=app.config["UPLOAD_SESSION_HOURS"])
+    for old in UploadSession.query.filter(UploadSession.user_id == current_user.id, UploadSession.updated_at < cutoff).all():
+        _discard_upload_session(old)
+    # Only the same file resumes; a session for another file with this name and size is stale.
+    # Without a fingerprint the file cannot be recognized, so the upload always starts over
+    session = None
+    for candidate in UploadSession.query.filter_by(user_id=current_user.id, doc_type=doc_type, document_id=document_id, filename=filename, length=length).all():
+        if fingerprint and candidate.fingerprint == fingerprint and session is None:
+            session = candidate
+        else:
+            _discard_upload_session(candidate)
+    if session is None:
+        session = UploadSession(id=uuid.uuid4().hex, user_id=current_user.id, doc_type=doc_type, document_id=document_id, filename=filename, length=length, fingerprint=fingerprint, offset=0)
+        db.session.add(session)
+        os.makedirs(os.path.dirname(_partial_path(session.id)), exist_ok=True)
+        open(_partial_path(session.id), "wb").close()
+    db.session.commit()
+    resp = jsonify(_upload_json(session))
+    resp.status_code = 201
+    resp.headers["Location"] = url_for("upload_status", upload_id=session.id)
+    resp.headers["Upload-Offset"] = str(session.offset)
+    resp.headers["Upload-Length"] = str(session.length)
+    return resp
+
+@app.route("/uploads/<upload_id>", methods=["GET", "HEAD"])
+@login_required
+def upload_status(upload_id):
+    session = _get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "not found"}), 404
+    resp = jsonify(_upload_json(session))
+    resp.headers["Upload-Offset"] = str(session.offset)
+    resp.headers["Upload-Length"] = str(session.length)
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
+def _finish_upload(session, digest, mime):
+    """Commit the Document for a fully received upload session and answer the last PATCH."""
+    sha256 = _commit_blob_file(_partial_path(session.id), digest.hexdigest())
+    session_replace = bool(session.document_id)
+    if session.document_id:
+        d = db.session.get(Document, session.document_id)
+        if d is None or d.user_id != current_user.id:
+            _discard_upload_session(session)
+            db.session.commit()
+            return jsonify({"error": "not found"}), 404
+    else:
+        d = Document.query.filter_by(user_id=current_user.id, doc_type=session.doc_type).first()
+    replaced = d is not None
+    if d is None:
+        d = Document(user_id=current_user.id, doc_type=session.doc_type)
+        db.session.add(d)
+    _attach_blob(d, sha256, session.length, session.filename, mime)
+    result = _upload_json(session, complete=True, replaced=replaced)
+    feed_events = _document_events("replaced" if replaced else "created", [d])
+    _discard_upload_session(session)
+    db.session.commit()
+    change_feed.publish(feed_events)
+    _schedule_renditions(d)
+    result["document_id"] = d.id
+    flash("تم إعادة رفع الملف" if session_replace else "تم استبدال الملف بنجاح" if replaced else "تم رفع الملف بنجاح")
+    resp = jsonify(result)
+    resp.headers["Upload-Offset"] = str(result["offset"])
+    return resp
+
+@app.route("/uploads/<upload_id>", methods=["PATCH"])
+@login_required
+def upload_chunk(upload_id):
+    session = _get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "not found"}), 404
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "missing Upload-Offset"}), 400
+    if offset != session.offset:
+        return jsonify(_upload_json(session, error="offset mismatch")), 409
+    digest = _upload_hasher(session)
+    written = 0
+    with _timed("store_chunk"), open(_partial_path(session.id), "r+b") as out:
+        out.seek(offset)
+        while True:
+            chunk = request.stream.read(STORAGE_CHUNK_SIZE)
+            if not chunk:
+                break
+            if offset + written + len(chunk) > session.length:
+                return jsonify(_upload_json(session, error="chunk exceeds upload length")), 400
+            digest.update(chunk)
+            out.write(chunk)
+            written += len(chunk)
+        # Drop bytes left behind by an interrupted earlier attempt at this offset
+        out.truncate()
+    metrics.inc("hr_upload_bytes_total", written)
+    # Only one writer may advance a given offset
+    updated = UploadSession.query.filter_by(id=session.id, offset=offset).update({UploadSession.offset: offset + written, UploadSession.updated_at: datetime.utcnow()}, synchronize_session=False)
+    if not updated:
+        db.session.rollback()
+        return jsonify({"error": "offset mismatch"}), 409
+    db.session.commit()
+    db.session.refresh(session)
+    if session.offset < session.length:
+        with _upload_hashers_lock:
+            _upload_hashers[session.id] = (session.offset, digest)
+        resp = jsonify(_upload_json(session, complete=False))
+        resp.headers["Upload-Offset"] = str(session.offset)
+        return resp
+    # Last chunk: check the real type, move the file to its content address and commit the Document
+    # with the session removal
+    with open(_partial_path(session.id), "rb") as fh:
+        mime = _upload_mime(fh.read(SNIFF_BYTES), session.filename)
+    if not mime:
+        _discard_upload_session(session)
+        db.session.commit()
+        return jsonify({"error": "الرجاء رفع ملف بصيغة مسموحة: PDF أو صورة (PNG, JPG, JPEG)"}), 415
+    try:
+        return _finish_upload(session, digest, mime)
+    except Exception:
+        db.session.rollback()
+        # The partial bytes may already have moved to their content address: drop the session so
+        # a retry starts a new upload instead of resuming from a file that is gone
+        with _upload_hashers_lock:
+            _upload_hashers.pop(upload_id, None)
+        try:
+            os.remove(_partial_path(upload_id))
+        except OSError:
+            pass
+        UploadSession.query.filter_by(id=upload_id).delete(synchronize_session=False)
+        db.session.commit()
+        raise
+
+@app.route("/uploads/<upload_id>", methods=["DELETE"])
+@login_required
+def upload_cancel(upload_id):
+    session = _get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "not found"}), 404
+    _discard_upload_session(session)
+    db.session.commit()
+    return "", 204
+
 @app.route("/admin", methods=["GET","POST"])
 @login_required
 def admin():
@@ -270,28 +1656,119 @@ def admin():
         db.session.commit()
         flash("تم إنشاء المستخدم بنجاح")
         return redirect(request.form.get("next") or request.referrer or url_for("admin"))
-    docs = Document.query.all()
-    users_by_id = {u.id: (u.name or u.email) for u in User.query.all()}
-    users = User.query.order_by(User.id.desc()).all()
-    # Aggregate clients who have files with counts and last upload time
-    agg = db.session.query(
-        Document.user_id,
-        func.count(Document.id).label("file_count"),
-        func.max(Document.created_at).label("last_upload")
-    ).group_by(Document.user_id).all()
-    clients_info = []
-    for row in agg:
-        u = User.query.get(row.user_id)
-        if u:
-            clients_info.append({
-                "id": u.id,
-                "name": u.name or u.email,
-                "email": u.email,
-                "file_count": row.file_count,
-                "last_upload": row.last_upload
-            })
-    latest_docs = Document.query.order_by(Document.created_at.desc()).limit(10).all()
-    return render_template("admin.html", docs=docs, users_by_id=users_by_id, users=users, clients_info=clients_info, latest_docs=latest_docs, doc_type_labels=DOC_TYPE_LABELS)
+    summary = _dashboard_summary()
+    return render_template("admin.html", doc_type_labels=DOC_TYPE_LABELS, **summary)
+
+# Bulk user import (CSV or JSON rows of name, email, password, role): one duplicate check query,
+# password hashing spread over a process pool, batched inserts and a single commit.
+IMPORT_BATCH_SIZE = 500
+
+def _read_import_rows(stream, filename):
+    """Parse an uploaded CSV/JSON file into a list of dicts."""
+    if (filename or "").lower().endswith(".json"):
+        data = json.load(io.TextIOWrapper(stream, encoding="utf-8-sig"))
+        rows = data.get("users", []) if isinstance(data, dict) else data
+        return [r if isinstance(r, dict) else {} for r in rows]
+    return list(csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")))
+
+# forkserver is POSIX-only; spawn works everywhere
+_HASH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _hash_passwords(passwords):
+    workers = min(app.config.get("IMPORT_HASH_WORKERS", 1), len(passwords))
+    if workers > 1 and len(passwords) >= 8:
+        try:
+            # Never fork this process: it runs threads and holds open database connections
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(_HASH_START_METHOD)) as pool:
+                return list(pool.map(generate_password_hash, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+        except (OSError, RuntimeError):
+            app.logger.warning("Process pool unavailable, hashing passwords serially")
+    return [generate_password_hash(p) for p in passwords]
+
+def _import_users(rows):
+    """Validate and create users; returns (created_count, per-row results)."""
+    results, valid, seen = [], [], set()
+    for n, row in enumerate(rows, start=1):
+        name = (row.get("name") or "").strip()
+        email = (row.get("email") or "").strip()
+        password = (row.get("password") or "").strip()
+        role = (row.get("role") or "client").strip() or "client"
+        error = None
+        if not name or not email or not password:
+            error = "name, email and password are required"
+        elif role not in ["client", "supervisor"]:
+            error = "invalid role"
+        elif email in seen:
+            error = "duplicate email in file"
+        result = {"row": n, "email": email, "ok": error is None}
+        if error:
+            result["error"] = error
+        else:
+            seen.add(email)
+            valid.append((result, {"name": name, "email": email, "password": password, "role": role}))
+        results.append(result)
+    if valid:
+        existing = {e for (e,) in db.session.query(User.email).filter(User.email.in_([v["email"] for _, v in valid]))}
+        for result, values in valid:
+            if values["email"] in existing:
+                result["ok"] = False
+                result["error"] = "user already exists"
+        valid = [(r, v) for r, v in valid if r["ok"]]
+    if valid:
+        hashes = _hash_passwords([v["password"] for _, v in valid])
+        records = [dict(v, password=h) for (_, v), h in zip(valid, hashes)]
+        for i in range(0, len(records), IMPORT_BATCH_SIZE):
+            db.session.execute(db.insert(User), records[i:i + IMPORT_BATCH_SIZE])
+        db.session.commit()
+    return len(valid), results
+
+@app.route("/admin/users/import", methods=["POST"])
+@login_required
+def import_users():
+    wants_json = request.is_json or request.accept_mimetypes.best == "application/json"
+    next_url = request.form.get("next") or request.referrer or url_for("admin_manage")
+    if current_user.role != "admin":
+        if wants_json:
+            return jsonify({"error": "forbidden"}), 403
+        flash("غير مسموح")
+        return redirect(next_url)
+    try:
+        if request.is_json:
+            data = request.get_json()
+            rows = data.get("users", []) if isinstance(data, dict) else data
+            rows = [r if isinstance(r, dict) else {} for r in rows]
+        else:
+            f = request.files.get("file")
+            if not f or not f.filename:
+                flash("يجب اختيار ملف")
+                return redirect(next_url)
+            rows = _read_import_rows(f.stream, f.filename)
+    except (ValueError, UnicodeDecodeError, csv.Error, AttributeError, TypeError):
+        if wants_json:
+            return jsonify({"error": "invalid file"}), 400
+        flash("ملف غير صالح")
+        return redirect(next_url)
+    created, results = _import_users(rows)
+    if wants_json:
+        return jsonify({"created": created, "failed": len(results) - created, "results": results})
+    failed = [r for r in results if not r["ok"]]
+    message = "تم إنشاء %d مستخدم" % created
+    if failed:
+        message += "، وتعذر استيراد %d: " % len(failed) + "، ".join("سطر %d (%s)" % (r["row"], r["error"]) for r in failed[:5])
+    flash(message)
+    return redirect(next_url)
+
+@app.cli.command("import-users")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_users_command(path):
+    """Create users from a CSV (name,email,password,role) or JSON file."""
+    with open(path, "rb") as fh:
+        rows = _read_import_rows(fh, path)
+    created, results = _import_users(rows)
+    for r in results:
+        if not r["ok"]:
+            click.echo("row %d %s: %s" % (r["row"], r["email"] or "-", r["error"]))
+    click.echo("created %d of %d users" % (created, len(results)))
 
 @app.route("/admin/manage")
 @login_required
@@ -318,6 +1795,7 @@ def admin_change_password():
         return redirect(request.form.get("next") or request.referrer or url_for("admin_manage"))
     u.password = generate_password_hash(new_password)
     db.session.commit()
+    user_cache.invalidate(u.id)
     flash("تم تغيير كلمة المرور")
     return redirect(request.form.get("next") or request.referrer or url_for("admin_manage"))
 
@@ -334,17 +1812,20 @@ def delete_user(id):
     if u.role == "admin":
         flash("لا يمكن حذف مدير")
         return redirect(request.form.get("next") or request.referrer or url_for("admin"))
-    docs = Document.query.filter_by(user_id=id).all()
-    for d in docs:
-        try:
-            file_path = os.path.join(app.config["UPLOAD_FOLDER"], d.filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
-        db.session.delete(d)
+    # Set-based: one grouped release per distinct blob and bulk deletes, however many files the
+    # client has; the files themselves are removed by the reaper after commit
+    rows = db.session.query(Document.blob_sha256, Document.filename).filter(Document.user_id == id).all()
+    for sha256, count in Counter(sha for sha, _ in rows if sha).items():
+        _release_blob(sha256, count)
+    _remove_after_commit(paths=[os.path.join(app.config["UPLOAD_FOLDER"], name) for sha, name in rows if not sha and name])
+    sessions = [sid for (sid,) in db.session.query(UploadSession.id).filter(UploadSession.user_id == id)]
+    _remove_after_commit(paths=[_partial_path(sid) for sid in sessions])
+    UploadSession.query.filter(UploadSession.user_id == id).delete(synchronize_session=False)
+    Document.query.filter(Document.user_id == id).delete(synchronize_session=False)
+    db.session.expire(u, ["documents"])
     db.session.delete(u)
     db.session.commit()
+    user_cache.invalidate(id)
     flash("تم حذف المستخدم وكل ملفاته")
     return redirect(request.form.get("next") or request.referrer or url_for("admin"))
 
@@ -353,27 +1834,8 @@ def delete_user(id):
 def supervisor():
     if current_user.role != "supervisor":
         return "Forbidden"
-    docs = Document.query.all()
-    users_by_id = {u.id: (u.name or u.email) for u in User.query.all()}
-    # Aggregate clients who have files
-    agg = db.session.query(
-        Document.user_id,
-        func.count(Document.id).label("file_count"),
-        func.max(Document.created_at).label("last_upload")
-    ).group_by(Document.user_id).all()
-    clients_info = []
-    for row in agg:
-        u = User.query.get(row.user_id)
-        if u:
-            clients_info.append({
-                "id": u.id,
-                "name": u.name or u.email,
-                "email": u.email,
-                "file_count": row.file_count,
-                "last_upload": row.last_upload
-            })
-    latest_docs = Document.query.order_by(Document.created_at.desc()).limit(10).all()
-    return render_template("supervisor.html", docs=docs, users_by_id=users_by_id, clients_info=clients_info, latest_docs=latest_docs, doc_type_labels=DOC_TYPE_LABELS)
+    summary = _dashboard_summary()
+    return render_template("supervisor.html", doc_type_labels=DOC_TYPE_LABELS, **summary)
 
 @app.route("/review/<int:id>/<status>")
 @login_required
@@ -389,7 +1851,9 @@ def review(id, status):
     # Clear any previous rejection reason when approving or setting pending
     if status in ["approved", "pending"]:
         d.reason = None
+    feed_events = _document_events("reviewed", [d])
     db.session.commit()
+    change_feed.publish(feed_events)
     next_url = request.args.get("next") or request.referrer or (url_for("admin") if current_user.role == "admin" else url_for("supervisor"))
     return redirect(next_url)
 
@@ -403,26 +1867,141 @@ def review_reject(id):
     d.status = "rejected"
     d.reviewed_at = datetime.utcnow()
     d.reason = reason if reason else None
+    feed_events = _document_events("reviewed", [d])
     db.session.commit()
+    change_feed.publish(feed_events)
     next_url = request.form.get("next") or request.referrer or (url_for("admin") if current_user.role == "admin" else url_for("supervisor"))
     return redirect(next_url)
 
-@app.route("/files/<name>")
+# Batch review: one lookup query, one reviewed_at and one transaction for many documents.
+# Accepts JSON {"ids": [...], "status": "...", "reason": "...", "reasons": {"<id>": "..."}} or the
+# equivalent form fields (ids repeated, reason_<id>); answers JSON with a result per id.
+@app.route("/review/bulk", methods=["POST"])
+@login_required
+def review_bulk():
+    wants_json = request.is_json or request.accept_mimetypes.best == "application/json"
+    if current_user.role not in ["admin", "supervisor"]:
+        return (jsonify({"error": "forbidden"}), 403) if wants_json else "Forbidden"
+    data = request.get_json(silent=True) or {}
+    if request.is_json:
+        if not isinstance(data, dict) or not isinstance(data.get("reasons") or {}, dict):
+            return jsonify({"error": "invalid body"}), 400
+        raw_ids = data.get("ids") or []
+        status = str(data.get("status") or "").strip()
+        default_reason = str(data.get("reason") or "").strip()
+        reasons = {str(k): str(v or "").strip() for k, v in (data.get("reasons") or {}).items()}
+    else:
+        raw_ids = request.form.getlist("ids")
+        status = (request.form.get("status") or "").strip()
+        default_reason = (request.form.get("reason") or "").strip()
+        reasons = {k[len("reason_"):]: v.strip() for k, v in request.form.items() if k.startswith("reason_")}
+    error = None
+    ids = []
+    for raw in raw_ids if isinstance(raw_ids, list) else []:
+        try:
+            ids.append(int(raw))
+        except (TypeError, ValueError):
+            error = "invalid id"
+    ids = list(dict.fromkeys(ids))
+    if status not in ["approved", "rejected", "pending"]:
+        error = "invalid status"
+    elif not ids:
+        error = error or "no documents selected"
+    elif len(ids) > app.config["BULK_REVIEW_MAX"]:
+        error = "too many documents (max %d)" % app.config["BULK_REVIEW_MAX"]
+    if error:
+        if wants_json:
+            return jsonify({"error": error}), 400
+        flash("بيانات غير صحيحة")
+        return redirect(request.form.get("next") or request.referrer or (url_for("admin") if current_user.role == "admin" else url_for("supervisor")))
+    docs = {d.id: d for d in Document.query.options(joinedload(Document.user)).filter(Document.id.in_(ids)).all()}
+    reviewed_at = datetime.utcnow() if status in ["approved", "rejected"] else None
+    results = []
+    for doc_id in ids:
+        d = docs.get(doc_id)
+        if d is None:
+            results.append({"id": doc_id, "ok": False, "error": "not found"})
+            continue
+        d.status = status
+        d.reviewed_at = reviewed_at
+        if status == "rejected":
+            d.reason = reasons.get(str(doc_id)) or default_reason or None
+        else:
+            d.reason = None
+        results.append({"id": doc_id, "ok": True, "status": status, "reason": d.reason})
+    feed_events = _document_events("reviewed", list(docs.values())) if docs else []
+    db.session.commit()
+    change_feed.publish(feed_events)
+    updated = sum(1 for r in results if r["ok"])
+    if wants_json:
+        return jsonify({
+            "status": status,
+            "reviewed_at": reviewed_at.isoformat() if reviewed_at else None,
+            "reviewed_at_local": format_local(reviewed_at),
+            "updated": updated,
+            "results": results
+        })
+    flash("تم تحديث %d مستند" % updated)
+    return redirect(request.form.get("next") or request.referrer or (url_for("admin") if current_user.role == "admin" else url_for("supervisor")))
+
+# Document bytes are served with a strong ETag (the content hash), 304 revalidation and Range
+# support; URLs carrying ?v=<sha256> never change content and may be cached as immutable.
+def _content_disposition(disposition, filename):
+    try:
+        filename.encode("ascii")
+        return '%s; filename="%s"' % (disposition, filename.replace("\\", "\\\\").replace('"', '\\"'))
+    except UnicodeEncodeError:
+        return "%s; filename*=UTF-8''%s" % (disposition, quote(filename))
+
+def _send_document(doc, as_attachment, mimetype=None):
+    # Times the lookup and response setup; the bytes themselves are streamed after the view returns
+    with _timed("serve"):
+        return _build_document_response(doc, as_attachment, mimetype)
+
+def _build_document_response(doc, as_attachment, mimetype=None):
+    path = _document_path(doc)
+    mode = app.config.get("FILE_SERVE_MODE", "app")
+    proxied = mode in ["x-accel", "x-sendfile"]
+    # A web server sending a blob answers 404 itself, so the worker does not stat the file
+    if not (proxied and doc.blob_sha256) and not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetype or doc.mime_type or mimetypes.guess_type(doc.filename or "")[0] or "application/octet-stream"
+    versioned = bool(doc.blob_sha256) and request.args.get("v") == doc.blob_sha256
+    cache_control = "private, max-age=31536000, immutable" if versioned else "private, no-cache"
+    if proxied:
+        etag = doc.blob_sha256 or "%x-%x" % (int(os.path.getmtime(path)), os.path.getsize(path))
+        if request.if_none_match.contains(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = app.response_class(mimetype=mimetype)
+            if mode == "x-accel":
+                rel = os.path.relpath(path, app.config["UPLOAD_FOLDER"]).replace(os.sep, "/")
+                resp.headers["X-Accel-Redirect"] = app.config["X_ACCEL_PREFIX"].rstrip("/") + "/" + quote(rel)
+            else:
+                resp.headers["X-Sendfile"] = os.path.abspath(path)
+            resp.headers["Content-Disposition"] = _content_disposition("attachment" if as_attachment else "inline", doc.filename or os.path.basename(path))
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = cache_control
+        return resp
+    resp = send_file(path, mimetype=mimetype, as_attachment=as_attachment, download_name=doc.filename or os.path.basename(path), conditional=True, etag=doc.blob_sha256 or True)
+    resp.headers["Cache-Control"] = cache_control
+    return resp
+
+@app.route("/files/<int:id>")
 @login_required
-def files(name):
-    doc = Document.query.filter_by(filename=name).first_or_404()
+def files(id):
+    doc = Document.query.get_or_404(id)
     if current_user.role in ["admin", "supervisor"] or current_user.id == doc.user_id:
         # Force download when using the 'تحميل' button
-        return send_from_directory(app.config["UPLOAD_FOLDER"], name, as_attachment=True)
+        return _send_document(doc, as_attachment=True)
     return "Forbidden", 403
 
-@app.route("/preview/<name>")
+@app.route("/preview/<int:id>")
 @login_required
-def preview_file(name):
-    doc = Document.query.filter_by(filename=name).first_or_404()
+def preview_file(id):
+    doc = Document.query.get_or_404(id)
     if current_user.role in ["admin", "supervisor"] or current_user.id == doc.user_id:
-        import mimetypes
-        mime = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        mime = doc.mime_type or mimetypes.guess_type(doc.filename or "")[0] or "application/octet-stream"
         # Allow preview for PDFs, images, and text files; otherwise show an informative page
         allow_inline = False
         try:
@@ -430,11 +2009,140 @@ def preview_file(name):
         except Exception:
             allow_inline = False
         if allow_inline:
-            return send_from_directory(app.config["UPLOAD_FOLDER"], name, as_attachment=False, mimetype=mime)
+            return _send_document(doc, as_attachment=False, mimetype=mime)
         else:
-            return render_template("preview_unsupported.html", filename=name)
+            return render_template("preview_unsupported.html", doc=doc)
     return "Forbidden", 403
 
+@app.route("/renditions/<int:id>/<kind>")
+@login_required
+def rendition(id, kind):
+    if kind not in RENDITION_SIZES:
+        return "Not found", 404
+    doc = Document.query.get_or_404(id)
+    if current_user.role not in ["admin", "supervisor"] and current_user.id != doc.user_id:
+        return "Forbidden", 403
+    if not doc.blob_sha256:
+        return "Not found", 404
+    path = _rendition_path(doc.blob_sha256, kind)
+    if not os.path.exists(path):
+        # Not rendered yet (or evicted): queue it and let the page fall back to the original
+        _schedule_renditions(doc)
+        return "Not found", 404
+    try:
+        os.utime(path)  # keeps recently viewed renditions at the end of the eviction order
+    except OSError:
+        pass
+    # Only a URL carrying the content hash (?v=) always means the same bytes; the plain URL shows the
+    # replacement after a new upload. Both are private to the client and the staff
+    versioned = request.args.get("v") == doc.blob_sha256
+    resp = send_from_directory(os.path.dirname(path), os.path.basename(path), mimetype="image/jpeg", max_age=365 * 24 * 3600 if versioned else None)
+    resp.headers["Cache-Control"] = "private, max-age=31536000, immutable" if versioned else "private, no-cache"
+    return resp
+
+# ZIP export: the archive is produced while it is sent. Entries are stored (PDF/JPEG do not
+# compress) and copied in small chunks, so neither memory nor disk grows with the export size.
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and the response drains."""
+    def __init__(self):
+        self._chunks = []
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._size += len(b)
+        return len(b)
+
+    def pending(self):
+        return self._size
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        self._size = 0
+        return data
+
+def _zip_stream(entries):
+    """Yield a ZIP archive of (arcname, path, datetime) entries; missing files are skipped."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, path, dt in entries:
+            try:
+                size = os.path.getsize(path)
+                src = open(path, "rb")
+            except OSError:
+                app.logger.warning("Export skipped missing file %s", path)
+                continue
+            with src:
+                info = zipfile.ZipInfo(arcname, date_time=(dt or datetime.utcnow()).timetuple()[:6])
+                info.compress_type = zipfile.ZIP_STORED
+                info.file_size = size
+                with zf.open(info, "w") as dest:
+                    while True:
+                        chunk = src.read(STORAGE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        dest.write(chunk)
+                        if sink.pending() >= STORAGE_CHUNK_SIZE:
+                            yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+def _export_arcname(used, folder, doc_type, filename):
+    label = DOC_TYPE_LABELS.get(doc_type) or os.path.splitext(filename or "")[0] or "document"
+    ext = os.path.splitext(filename or "")[1].lower()
+    base = (folder + "/" if folder else "") + label.replace("/", "-")
+    name, n = base + ext, 1
+    while name in used:
+        n += 1
+        name = "%s (%d)%s" % (base, n, ext)
+    used.add(name)
+    return name
+
+def _zip_response(entries, download_name):
+    resp = app.response_class(stream_with_context(_zip_stream(entries)), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = _content_disposition("attachment", download_name)
+    resp.headers["Cache-Control"] = "private, no-store"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+@app.route("/clients/<int:user_id>/export.zip")
+@login_required
+def export_client(user_id):
+    if current_user.role not in ["admin", "supervisor"] and current_user.id != user_id:
+        return "Forbidden", 403
+    user = User.query.get_or_404(user_id)
+    docs = Document.query.filter_by(user_id=user_id).order_by(Document.doc_type, Document.id).all()
+    used = set()
+    entries = [(_export_arcname(used, "", d.doc_type, d.filename), _document_path(d), d.created_at) for d in docs]
+    return _zip_response(entries, "client-%d-%s.zip" % (user.id, secure_filename(user.name or user.email) or "documents"))
+
+@app.route("/export.zip")
+@login_required
+def export_documents():
+    """Documents across clients matching the search filters, one folder per client."""
+    if current_user.role not in ["admin", "supervisor"]:
+        return "Forbidden", 403
+    try:
+        filters = _parse_search_filters(request.args)
+    except ValueError as e:
+        return str(e), 400
+    query = db.session.query(
+        Document.id, Document.doc_type, Document.filename, Document.blob_sha256, Document.created_at,
+        User.id.label("owner_id"), User.name.label("owner_name"), User.email.label("owner_email")
+    ).join(User, Document.user_id == User.id)
+    query = _filter_users(_filter_documents(query, filters), filters).order_by(User.id, Document.doc_type, Document.id)
+
+    def entries():
+        used = set()
+        for row in query.yield_per(500):
+            folder = "%s-%d" % ((row.owner_name or row.owner_email or "client").replace("/", "-"), row.owner_id)
+            yield _export_arcname(used, folder, row.doc_type, row.filename), _document_path(row), row.created_at
+    return _zip_response(entries(), "documents-%s.zip" % datetime.utcnow().strftime("%Y%m%d-%H%M"))
+
 # Route: show all documents for a specific client (admin/supervisor only)
 @app.route("/clients/<int:user_id>")
 @login_required
@@ -444,41 +2152,432 @@ def client_docs(user_id):
     user = User.query.get_or_404(user_id)
     docs = Document.query.filter_by(user_id=user_id).order_by(Document.created_at.desc()).all()
     return render_template("client_detail.html", user=user, docs=docs, doc_type_labels=DOC_TYPE_LABELS)
+
+@app.route("/api/clients")
+@login_required
+def api_clients():
+    if current_user.role not in ["admin", "supervisor"]:
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        filters = _parse_search_filters(request.args)
+        items, next_cursor = _search_clients(filters, request.args.get("cursor"), _page_limit(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": [_client_json(ci) for ci in items], "next_cursor": next_cursor})
+
+@app.route("/api/documents")
+@login_required
+def api_documents():
+    if current_user.role not in ["admin", "supervisor"]:
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        filters = _parse_search_filters(request.args)
+        items, next_cursor = _search_documents(filters, request.args.get("cursor"), _page_limit(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": [_document_json(d) for d in items], "next_cursor": next_cursor})
     
-with app.app_context():
-    db.create_all()
-    # شغّل مساعدات ترقية SQLite فقط عند استخدام SQLite لتفادي أخطاء على PostgreSQL
-    bind = db.session.get_bind() or db.engine
-    dialect_name = getattr(getattr(bind, "dialect", None), "name", "")
-    if dialect_name == "sqlite":
+# Completeness matrix: one grouped query pivots each client's documents into a status per
+# REQUIRED_DOCS type (max(case(doc_type = k, status)), at most one row per type thanks to the
+# unique index), with HAVING filters and keyset paging on the client id like /api/clients.
+COMPLETENESS_STATES = ["incomplete", "complete", "approved"]
+
+def _parse_completeness_filters(args):
+    filters = {}
+    q = (args.get("q") or "").strip()
+    if q:
+        filters["q"] = q
+    missing = [m.strip() for m in args.getlist("missing") if m.strip()]
+    for key in missing:
+        if key not in DOC_TYPE_LABELS:
+            raise ValueError("invalid missing doc_type")
+    if missing:
+        filters["missing"] = missing
+    for flag in ["has_rejected", "has_pending"]:
+        if (args.get(flag) or "").strip() in ["1", "true", "on"]:
+            filters[flag] = True
+    state = (args.get("state") or "").strip()
+    if state:
+        if state not in COMPLETENESS_STATES:
+            raise ValueError("invalid state")
+        filters["state"] = state
+    return filters
+
+def _completeness_query(filters, cursor=None):
+    keys = [d["key"] for d in REQUIRED_DOCS]
+    by_type = {k: func.max(case((Document.doc_type == k, Document.status))) for k in keys}
+    def status_count(status):
+        return func.sum(case((Document.status == status, 1), else_=0))
+    provided = func.count(Document.id)
+    query = db.session.query(
+        User.id,
+        User.name,
+        User.email,
+        provided.label("provided"),
+        status_count("approved").label("approved_count"),
+        status_count("pending").label("pending_count"),
+        status_count("rejected").label("rejected_count"),
+        *[by_type[k].label("doc_" + k) for k in keys]
+    ).outerjoin(Document, and_(Document.user_id == User.id, Document.doc_type.in_(keys))).filter(User.role == "client")
+    query = _filter_users(query, filters)
+    if cursor:
         try:
-            cols = [row[1] for row in db.session.execute(text("PRAGMA table_info(document)")).fetchall()]
-            if "created_at" not in cols:
-                db.session.execute(text("ALTER TABLE document ADD COLUMN created_at DATETIME"))
-            if "reviewed_at" not in cols:
-                db.session.execute(text("ALTER TABLE document ADD COLUMN reviewed_at DATETIME"))
-            if "reason" not in cols:
-                db.session.execute(text("ALTER TABLE document ADD COLUMN reason TEXT"))
-            if "doc_type" not in cols:
-                db.session.execute(text("ALTER TABLE document ADD COLUMN doc_type VARCHAR(50)"))
+            query = query.filter(User.id < int(cursor))
+        except ValueError:
+            raise ValueError("invalid cursor")
+    query = query.group_by(User.id)
+    for key in filters.get("missing", []):
+        query = query.having(by_type[key].is_(None))
+    if filters.get("has_rejected"):
+        query = query.having(status_count("rejected") > 0)
+    if filters.get("has_pending"):
+        query = query.having(status_count("pending") > 0)
+    state = filters.get("state")
+    if state == "incomplete":
+        query = query.having(provided < len(keys))
+    elif state == "complete":
+        query = query.having(provided == len(keys))
+    elif state == "approved":
+        query = query.having(status_count("approved") == len(keys))
+    return query.order_by(User.id.desc())
+
+def _completeness_json(row):
+    return {
+        "id": row.id,
+        "name": row.name or row.email,
+        "email": row.email,
+        "provided": row.provided,
+        "required": len(REQUIRED_DOCS),
+        "approved_count": row.approved_count or 0,
+        "pending_count": row.pending_count or 0,
+        "rejected_count": row.rejected_count or 0,
+        "docs": {d["key"]: getattr(row, "doc_" + d["key"]) for d in REQUIRED_DOCS},
+        "url": url_for("client_docs", user_id=row.id)
+    }
+
+def _search_completeness(filters, cursor=None, limit=25):
+    rows = _completeness_query(filters, cursor).limit(limit + 1).all()
+    items = [_completeness_json(row) for row in rows[:limit]]
+    next_cursor = str(items[-1]["id"]) if len(rows) > limit else None
+    return items, next_cursor
+
+@app.route("/completeness")
+@login_required
+def completeness():
+    if current_user.role not in ["admin", "supervisor"]:
+        return "Forbidden"
+    items, next_cursor = _search_completeness({}, limit=app.config.get("SEARCH_PAGE_SIZE", 25))
+    return render_template("completeness.html", items=items, next_cursor=next_cursor, required_docs=REQUIRED_DOCS)
+
+@app.route("/api/completeness")
+@login_required
+def api_completeness():
+    if current_user.role not in ["admin", "supervisor"]:
+        return jsonify({"error": "forbidden"}), 403
+    try:
+        filters = _parse_completeness_filters(request.args)
+        items, next_cursor = _search_completeness(filters, request.args.get("cursor"), _page_limit(request.args))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"items": items, "next_cursor": next_cursor})
+
+@app.cli.command("storage-migrate")
+def storage_migrate():
+    """Move legacy flat uploads into the content-addressed blob store."""
+    moved, missing, migrated_paths = 0, 0, set()
+    for doc in Document.query.filter(Document.blob_sha256.is_(None)).all():
+        path = os.path.join(app.config["UPLOAD_FOLDER"], doc.filename or "")
+        if not doc.filename or not os.path.isfile(path):
+            missing += 1
+            continue
+        with open(path, "rb") as fh:
+            sha256, size = _store_stream(fh)
+        _acquire_blob(sha256, size)
+        doc.blob_sha256 = sha256
+        db.session.commit()
+        migrated_paths.add(path)
+        moved += 1
+    # Legacy names could be shared by several documents; keep files a legacy row still points at
+    still_used = {os.path.join(app.config["UPLOAD_FOLDER"], name) for (name,) in db.session.query(Document.filename).filter(Document.blob_sha256.is_(None))}
+    for path in migrated_paths - still_used:
+        os.remove(path)
+    click.echo("migrated %d documents, %d without a file on disk" % (moved, missing))
+
+@app.cli.command("storage-inspect")
+def storage_inspect():
+    """Record type, size, dimensions and page count of documents stored before upload ingest did."""
+    facts, inspected, missing = {}, 0, 0
+    for doc in Document.query.filter(Document.mime_type.is_(None)).all():
+        path = _document_path(doc) if doc.blob_sha256 or doc.filename else None
+        if path not in facts:
+            facts[path] = None
+            if path and os.path.isfile(path):
+                with open(path, "rb") as fh:
+                    head = fh.read(SNIFF_BYTES)
+                # Files already accepted are described, not refused, when their content is not allowed
+                mime = _upload_mime(head, doc.filename or "") or mimetypes.guess_type(doc.filename or "")[0] or "application/octet-stream"
+                facts[path] = (os.path.getsize(path), mime) + _file_metadata(path, mime)
+        if facts[path] is None:
+            missing += 1
+            continue
+        doc.size_bytes, doc.mime_type, doc.width, doc.height, doc.page_count = facts[path]
+        inspected += 1
+        if inspected % 500 == 0:
             db.session.commit()
-        except Exception:
-            pass
+    db.session.commit()
+    click.echo("inspected %d documents, %d without a file on disk" % (inspected, missing))
+
+# Schema migrations and seeding run from the CLI once per deploy (`flask db upgrade`, then
+# `flask seed`), never at import time, so starting a worker does no database I/O. Each step is
+# idempotent (it inspects before altering) and is recorded in hr_schema_version when applied.
+class SchemaVersion(db.Model):
+    __tablename__ = "hr_schema_version"
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(200))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def _add_column(conn, table, column, ddl):
+    insp = inspect(conn)
+    if insp.has_table(table) and column not in [c["name"] for c in insp.get_columns(table)]:
+        conn.execute(text('ALTER TABLE %s ADD COLUMN %s %s' % (table, column, ddl)))
+
+def _create_declared_indexes(conn, model, unique=True):
+    for index in model.__table__.indexes:
+        if unique or not index.unique:
+            index.create(conn, checkfirst=True)
+
+def _m001_rename_legacy_tables(conn):
+    insp = inspect(conn)
+    if not insp.has_table("hr_users") and insp.has_table("user"):
+        conn.execute(text('ALTER TABLE "user" RENAME TO hr_users'))
+    if not insp.has_table("hr_documents") and insp.has_table("document"):
+        conn.execute(text("ALTER TABLE document RENAME TO hr_documents"))
+
+def _m002_legacy_columns(conn):
+    _add_column(conn, "hr_documents", "created_at", "TIMESTAMP")
+    _add_column(conn, "hr_documents", "reviewed_at", "TIMESTAMP")
+    _add_column(conn, "hr_documents", "reason", "TEXT")
+    _add_column(conn, "hr_documents", "doc_type", "VARCHAR(50)")
+    _add_column(conn, "hr_users", "name", "VARCHAR(120)")
+
+def _m003_create_tables(conn):
+    db.metadata.create_all(bind=conn)
+
+def _m004_document_blobs(conn):
+    _add_column(conn, "hr_documents", "blob_sha256", "VARCHAR(64)")
+    # Unique indexes wait for the migration that removes the duplicates they would reject
+    _create_declared_indexes(conn, Document, unique=False)
+
+def _m005_document_uniqueness(conn):
+    docs, blobs = Document.__table__, Blob.__table__
+    # Legacy rows predate created_at; give them the oldest known time so keyset order needs no NULL handling
+    oldest = conn.execute(db.select(func.min(docs.c.created_at))).scalar() or datetime.utcnow()
+    conn.execute(docs.update().where(docs.c.created_at.is_(None)).values(created_at=func.coalesce(docs.c.reviewed_at, oldest)))
+    # Keep the newest document of each (user_id, doc_type) and release the blobs of the others.
+    # Untyped legacy rows are left alone (NULLs never collide in a unique index). Released files are
+    # removed by upgrade_schema once this transaction commits
+    dupes = conn.execute(db.select(docs.c.user_id, docs.c.doc_type).where(docs.c.doc_type.isnot(None)).group_by(docs.c.user_id, docs.c.doc_type).having(func.count() > 1)).all()
+    removed, paths, shas = [], [], []
+    for user_id, doc_type in dupes:
+        rows = conn.execute(db.select(docs.c.id, docs.c.blob_sha256, docs.c.filename).where(docs.c.user_id == user_id, docs.c.doc_type == doc_type).order_by(docs.c.created_at.desc(), docs.c.id.desc())).all()
+        for doc_id, sha256, filename in rows[1:]:
+            conn.execute(docs.delete().where(docs.c.id == doc_id))
+            removed.append(doc_id)
+            if sha256:
+                conn.execute(blobs.update().where(blobs.c.sha256 == sha256).values(ref_count=blobs.c.ref_count - 1))
+                shas.append(sha256)
+            elif filename:
+                paths.append(os.path.join(app.config["UPLOAD_FOLDER"], filename))
+    conn.execute(blobs.delete().where(blobs.c.ref_count <= 0))
+    if removed:
+        app.logger.warning("Removed %d duplicate documents (ids %s)", len(removed), ", ".join(str(i) for i in removed))
+        conn.info["pending_removals"] = (paths, shas)
+    _create_declared_indexes(conn, Document)
+
+def _m006_document_metadata(conn):
+    _add_column(conn, "hr_documents", "size_bytes", "BIGINT")
+    _add_column(conn, "hr_documents", "mime_type", "VARCHAR(100)")
+    _add_column(conn, "hr_documents", "width", "INTEGER")
+    _add_column(conn, "hr_documents", "height", "INTEGER")
+    _add_column(conn, "hr_documents", "page_count", "INTEGER")
+    # Sizes are already known for blob documents; type, dimensions and pages need the files and
+    # are filled in by `flask storage-inspect`
+    docs, blobs = Document.__table__, Blob.__table__
+    size = db.select(blobs.c.size).where(blobs.c.sha256 == docs.c.blob_sha256).scalar_subquery()
+    conn.execute(docs.update().where(docs.c.size_bytes.is_(None), docs.c.blob_sha256.isnot(None)).values(size_bytes=size))
+
+def _m007_user_search_trigram(conn):
+    # The name/email search is ILIKE '%q%', which only trigram indexes can serve. They exist on
+    # PostgreSQL only (pg_trgm is a trusted extension from 13 on, so the database owner can create
+    # it); on SQLite that search keeps walking hr_users
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_hr_users_name_trgm ON hr_users USING gin (name gin_trgm_ops)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_hr_users_email_trgm ON hr_users USING gin (email gin_trgm_ops)"))
+
+def _m008_upload_fingerprint(conn):
+    _add_column(conn, "hr_upload_sessions", "fingerprint", "VARCHAR(64)")
+
+MIGRATIONS = [
+    (1, "rename legacy user/document tables", _m001_rename_legacy_tables),
+    (2, "add columns missing from legacy tables", _m002_legacy_columns),
+    (3, "create missing tables", _m003_create_tables),
+    (4, "document blob reference and access-path indexes", _m004_document_blobs),
+    (5, "one document per client and type, created_at backfill", _m005_document_uniqueness),
+    (6, "document size, type, dimensions and page count", _m006_document_metadata),
+    (7, "trigram indexes for the client name/email search (PostgreSQL)", _m007_user_search_trigram),
+    (8, "upload session file fingerprint", _m008_upload_fingerprint),
+]
+
+def _applied_versions(conn):
+    SchemaVersion.__table__.create(conn, checkfirst=True)
+    return {v for (v,) in conn.execute(db.select(SchemaVersion.version))}
+
+def upgrade_schema(echo=click.echo):
+    """Apply pending migrations in order, each in its own transaction."""
+    engine = db.engine
+    for version, description, migrate in MIGRATIONS:
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                # Serialize concurrent deploys; the lock is released with the transaction
+                conn.execute(text("SELECT pg_advisory_xact_lock(7300401)"))
+            if version in _applied_versions(conn):
+                continue
+            conn.info.pop("pending_removals", None)
+            migrate(conn)
+            conn.execute(db.insert(SchemaVersion).values(version=version, description=description, applied_at=datetime.utcnow()))
+            # Files a migration released are removed only once its transaction has committed
+            paths, shas = conn.info.pop("pending_removals", ((), ()))
+        echo("applied %03d %s" % (version, description))
+        if paths or shas:
+            _remove_unreferenced_files(paths, shas)
+
+def seed_default_users():
+    """Create the default admin, client and supervisor accounts on an empty install."""
+    if User.query.filter_by(email="admin@test.com").first():
+        return False
+    db.session.add(User(email="admin@test.com", name="مدير", password=generate_password_hash("123"), role="admin"))
+    db.session.add(User(email="client@test.com", name="عميل", password=generate_password_hash("123"), role="client"))
+    db.session.add(User(email="supervisor@test.com", name="مشرف", password=generate_password_hash("123"), role="supervisor"))
+    db.session.commit()
+    return True
+
+@app.cli.group("db")
+def db_cli():
+    """Database schema commands."""
+
+@db_cli.command("upgrade")
+def db_upgrade():
+    """Apply pending schema migrations."""
+    upgrade_schema()
+    click.echo("schema is at version %d" % MIGRATIONS[-1][0])
+
+@db_cli.command("current")
+def db_current():
+    """Show applied and pending schema migrations."""
+    with db.engine.connect() as conn:
+        applied = _applied_versions(conn)
+        conn.commit()
+    for version, description, _ in MIGRATIONS:
+        click.echo("%03d %-8s %s" % (version, "applied" if version in applied else "pending", description))
+
+# Index audit: `flask db explain` runs EXPLAIN on the queries behind each route and fails when
+# a plan reads a whole table, so index coverage is checked rather than assumed. With --seed the
+# synthetic rows are inserted and analyzed inside a transaction that is rolled back afterwards.
+def _audited_queries():
+    """(route, query, tables the plan may walk in primary-key order because it stops at LIMIT)."""
+    uid, doc_type, sha256 = 1, REQUIRED_DOCS[0]["key"], "0" * 64
+    page = app.config.get("SEARCH_PAGE_SIZE", 25)
+    # Without pg_trgm (SQLite) the name/email search walks hr_users in key order up to the page size
+    search_walk = ("hr_users",) if db.engine.dialect.name != "postgresql" else ()
+    return [
+        ("login(): user by email", User.query.filter_by(email="admin@test.com"), ()),
+        ("client(): document by user and type", Document.query.filter_by(user_id=uid, doc_type=doc_type), ()),
+        ("client(): documents of the user", Document.query.filter_by(user_id=uid), ()),
+        ("client_docs(): documents newest first", Document.query.filter_by(user_id=uid).order_by(Document.created_at.desc()), ()),
+        ("files()/preview_file(): document by id", Document.query.filter_by(id=uid), ()),
+        ("admin(): latest documents", _documents_query({}).limit(page), ()),
+        ("api_documents(): by status", _documents_query({"status": "pending"}).limit(page), ()),
+        ("api_documents(): by type and status", _documents_query({"doc_type": doc_type, "status": "rejected"}).limit(page), ()),
+        ("api_clients(): clients with counts", _clients_query({}).limit(page), ("hr_users",)),
+        ("api_clients(): name/email search", _clients_query({"q": "explain-1"}).limit(page), search_walk),
+        ("api_completeness(): client x type matrix", _completeness_query({}).limit(page), ("hr_users",)),
+        ("storage: blob by hash", Blob.query.filter_by(sha256=sha256), ()),
+        ("storage: documents sharing a blob", Document.query.filter_by(blob_sha256=sha256), ()),
+        ("uploads: sessions of the user", UploadSession.query.filter_by(user_id=uid), ()),
+    ]
+
+def _explain(conn, query):
+    compiled = query.statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.params
+    if conn.dialect.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    if conn.dialect.name == "sqlite":
+        return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params)]
+    return [row[0] for row in conn.exec_driver_sql("EXPLAIN " + str(compiled), params)]
+
+def _full_scans(plan):
+    """Tables a plan reads in full: SQLite "SCAN t" without an index, PostgreSQL "Seq Scan on t"."""
+    tables = []
+    for line in plan:
+        line = line.strip().lstrip("-> ").strip()
+        if line.startswith("SCAN ") and " USING " not in line:
+            tables.append(line.split()[1])
+        elif line.startswith("Seq Scan on "):
+            tables.append(line.split()[3])
+    return tables
+
+def _seed_explain_data(conn, clients):
+    statuses = ["pending", "approved", "rejected"]
+    first = (conn.execute(db.select(func.max(User.id))).scalar() or 0) + 1
+    now = datetime.utcnow()
+    conn.execute(db.insert(User), [
+        {"id": first + i, "email": "explain-%d@example.invalid" % i, "name": "explain %d" % i, "password": "!", "role": "client"}
+        for i in range(clients)
+    ])
+    conn.execute(db.insert(Document), [
+        {"user_id": first + i, "doc_type": d["key"], "filename": "%s.pdf" % d["key"], "status": statuses[(i + j) % 3],
+         "created_at": now - timedelta(minutes=i * len(REQUIRED_DOCS) + j),
+         "blob_sha256": hashlib.sha256(b"%d:%d" % (i, j)).hexdigest()}
+        for i in range(clients) for j, d in enumerate(REQUIRED_DOCS)
+    ])
+    conn.exec_driver_sql("ANALYZE")
+
+@db_cli.command("explain")
+@click.option("--seed", "seed_clients", type=int, default=0, help="Insert this many synthetic clients (rolled back) before explaining.")
+@click.option("--verbose", is_flag=True, help="Print every plan, not only the flagged ones.")
+def db_explain(seed_clients, verbose):
+    """EXPLAIN the route queries and flag any full table scan."""
+    flagged = 0
+    with db.engine.connect() as conn:
+        trans = conn.begin()
         try:
-            ucols = [row[1] for row in db.session.execute(text("PRAGMA table_info(user)")).fetchall()]
-            if "name" not in ucols:
-                db.session.execute(text("ALTER TABLE user ADD COLUMN name VARCHAR(120)"))
-            db.session.commit()
-        except Exception:
-            pass
-    if not User.query.filter_by(email="admin@test.com").first():
-        db.session.add(User(email="admin@test.com", name="مدير", password=generate_password_hash("123"), role="admin"))
-        db.session.add(User(email="client@test.com", name="عميل", password=generate_password_hash("123"), role="client"))
-        db.session.add(User(email="supervisor@test.com", name="مشرف", password=generate_password_hash("123"), role="supervisor"))
-        db.session.commit()
+            if seed_clients > 0:
+                _seed_explain_data(conn, seed_clients)
+            for name, query, ordered in _audited_queries():
+                plan = _explain(conn, query)
+                scans = [t for t in _full_scans(plan) if t not in ordered or any("TEMP B-TREE" in line or "Sort" in line for line in plan)]
+                flagged += bool(scans)
+                click.echo("%-5s %s%s" % ("SCAN" if scans else "ok", name, " (%s)" % ", ".join(scans) if scans else ""))
+                if scans or verbose:
+                    for line in plan:
+                        click.echo("        " + line)
+        finally:
+            trans.rollback()
+    if flagged:
+        raise click.ClickException("%d queries read a whole table" % flagged)
+    click.echo("all queries use an index")
 
-    
+@app.cli.command("seed")
+def seed_command():
+    """Create the default accounts if they do not exist yet."""
+    click.echo("default users created" if seed_default_users() else "default users already exist")
 
 if __name__ == "__main__":
+    # Local development convenience; deployments run `flask db upgrade` and `flask seed` instead
+    with app.app_context():
+        upgrade_schema()
+        seed_default_users()
     app.run(debug=True, use_reloader=False)
   
\ No newline at end of file
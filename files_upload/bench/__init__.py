@@ -0,0 +1,36 @@
+"""Load-test and benchmark harness for the HR documents app.
+
+Seeds a local SQLite or PostgreSQL database with synthetic tenants and drives the main
+routes in-process with concurrent Flask test clients, reporting latency percentiles,
+throughput and peak RSS as JSON so runs can be compared. Run from the files_upload folder:
+
+    python -m bench seed --clients 10000
+    python -m bench run --duration 60 --concurrency 16 --output before.json
+    python -m bench compare before.json after.json
+"""
+import os
+import tempfile
+from urllib.parse import urlparse
+
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "hr-bench")
+LOCAL_HOSTS = {"", "localhost", "127.0.0.1", "::1"}
+
+def default_database_url(data_dir):
+    return "sqlite:///" + os.path.join(os.path.abspath(data_dir), "bench.db")
+
+def load_app(database_url, data_dir):
+    """Import app.py against the benchmark database and storage folders.
+
+    app.py reads its configuration at import time and falls back to the production database,
+    so the environment is set first and only local databases are accepted.
+    """
+    host = urlparse(database_url).hostname or ""
+    if not database_url.startswith("sqlite") and host not in LOCAL_HOSTS:
+        raise SystemExit("refusing to benchmark against non-local database host %r" % host)
+    os.makedirs(data_dir, exist_ok=True)
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["UPLOAD_FOLDER"] = os.path.join(os.path.abspath(data_dir), "uploads")
+    os.environ["RENDITION_FOLDER"] = os.path.join(os.path.abspath(data_dir), "renditions")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    import app as hr
+    return hr
@@ -0,0 +1,93 @@
+import json
+from datetime import datetime
+
+import click
+
+from . import DEFAULT_DATA_DIR, default_database_url, load_app
+
+def _open(database_url, data_dir):
+    return load_app(database_url or default_database_url(data_dir), data_dir)
+
+@click.group()
+def cli():
+    """Seed synthetic tenants, run the load mix and compare result files."""
+
+@cli.command()
+@click.option("--database-url", help="Local SQLite or PostgreSQL URL (default: SQLite in --data-dir).")
+@click.option("--data-dir", default=DEFAULT_DATA_DIR, show_default=True, help="Folder for the SQLite file, uploads and renditions.")
+@click.option("--clients", default=1000, show_default=True, help="Synthetic clients, each with one document per REQUIRED_DOCS type.")
+@click.option("--blobs", default=200, show_default=True, help="Distinct file payloads shared by the documents.")
+@click.option("--seed", "seed_value", default=1, show_default=True, help="Random seed, so the same volumes give the same data.")
+@click.option("--reset", is_flag=True, help="Delete earlier bench accounts, their documents and files first (other data is kept).")
+def seed(database_url, data_dir, clients, blobs, seed_value, reset):
+    """Create the schema and insert synthetic clients, documents and files."""
+    from .seed import reset as reset_data, seed as seed_data
+    hr = _open(database_url, data_dir)
+    with hr.app.app_context():
+        hr.upgrade_schema(echo=click.echo)
+        if reset:
+            reset_data(hr, echo=click.echo)
+        counts = seed_data(hr, clients, blob_pool=blobs, seed_value=seed_value, echo=click.echo)
+    click.echo("seeded %(clients)d clients, %(documents)d documents, %(blobs)d blobs" % counts)
+
+@cli.command()
+@click.option("--database-url", help="Local SQLite or PostgreSQL URL (default: SQLite in --data-dir).")
+@click.option("--data-dir", default=DEFAULT_DATA_DIR, show_default=True)
+@click.option("--duration", default=30, show_default=True, help="Measured seconds.")
+@click.option("--warmup", default=5, show_default=True, help="Seconds of load before measuring.")
+@click.option("--concurrency", default=8, show_default=True, help="Worker threads.")
+@click.option("--mix", help="Scenario weights, e.g. files=50,admin=10 (others keep their defaults; 0 disables).")
+@click.option("--seed", "seed_value", default=1, show_default=True)
+@click.option("--output", type=click.Path(dir_okay=False), help="JSON result file (default: bench-<timestamp>.json).")
+def run(database_url, data_dir, duration, warmup, concurrency, mix, seed_value, output):
+    """Drive login, uploads, dashboards, client pages, downloads and previews concurrently."""
+    from .load import DEFAULT_MIX, run as run_load
+    weights = dict(DEFAULT_MIX)
+    for part in filter(None, (mix or "").split(",")):
+        name, _, weight = part.partition("=")
+        if name.strip() not in weights:
+            raise click.BadParameter("unknown scenario %r" % name, param_hint="--mix")
+        weights[name.strip()] = int(weight)
+    weights = {k: v for k, v in weights.items() if v > 0}
+    hr = _open(database_url, data_dir)
+    report = run_load(hr, duration=duration, warmup=warmup, concurrency=concurrency, mix=weights, seed_value=seed_value, echo=click.echo)
+    output = output or "bench-%s.json" % datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    with open(output, "w") as fh:
+        json.dump(report, fh, indent=2, ensure_ascii=False)
+    _print_report(report)
+    click.echo("peak RSS %s MB; results written to %s" % (report["peak_rss_mb"], output))
+
+def _fmt(value, pattern="%.1f"):
+    return "-" if value is None else pattern % value
+
+def _print_report(report):
+    click.echo("%-15s %8s %6s %9s %9s %9s %9s" % ("scenario", "requests", "errors", "p50 ms", "p95 ms", "p99 ms", "req/s"))
+    for name, s in list(report["scenarios"].items()) + [("total", report["total"])]:
+        click.echo("%-15s %8d %6d %9s %9s %9s %9s" % (name, s["requests"], s["errors"], _fmt(s["p50_ms"]), _fmt(s["p95_ms"]), _fmt(s["p99_ms"]), _fmt(s["throughput_rps"])))
+
+@cli.command()
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@click.argument("candidate", type=click.Path(exists=True, dir_okay=False))
+def compare(baseline, candidate):
+    """Show the per-scenario change from BASELINE to CANDIDATE (negative latency change is better)."""
+    with open(baseline) as fh:
+        before = json.load(fh)
+    with open(candidate) as fh:
+        after = json.load(fh)
+
+    def change(old, new):
+        if old in (None, 0) or new is None:
+            return "-"
+        return "%+.1f%%" % ((new - old) * 100.0 / old)
+
+    click.echo("%-15s %10s %10s %10s %10s" % ("scenario", "p50", "p95", "p99", "req/s"))
+    names = [n for n in after["scenarios"] if n in before["scenarios"]] + ["total"]
+    for name in names:
+        old = before["total"] if name == "total" else before["scenarios"][name]
+        new = after["total"] if name == "total" else after["scenarios"][name]
+        click.echo("%-15s %10s %10s %10s %10s" % (name, change(old["p50_ms"], new["p50_ms"]), change(old["p95_ms"], new["p95_ms"]),
+                                                 change(old["p99_ms"], new["p99_ms"]), change(old["throughput_rps"], new["throughput_rps"])))
+    click.echo("peak RSS %s -> %s MB" % (before.get("peak_rss_mb"), after.get("peak_rss_mb")))
+
+if __name__ == "__main__":
+    cli(prog_name="python -m bench")
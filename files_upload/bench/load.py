@@ -0,0 +1,179 @@
+"""Concurrent in-process load: weighted route scenarios on Flask test clients, one per worker thread."""
+import io
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+from .seed import ADMIN_EMAIL, PASSWORD, SUPERVISOR_EMAIL, client_email, payload
+
+# Relative weights of each scenario in the request mix
+DEFAULT_MIX = {
+    "login": 5,
+    "client_upload": 5,
+    "client_replace": 5,
+    "admin": 10,
+    "supervisor": 10,
+    "client_docs": 15,
+    "files": 25,
+    "preview": 25,
+}
+UPLOAD_PAYLOADS = 8  # pre-generated per worker so payload generation is not timed
+
+class Worker:
+    """One thread's sessions: an admin, a supervisor and one client, each logged in once."""
+    def __init__(self, hr, rng, client_count, doc_ids, client_ids):
+        self.app, self.rng = hr.app, rng
+        self.client_count, self.doc_ids, self.client_ids = client_count, doc_ids, client_ids
+        self.admin = self.login(ADMIN_EMAIL)[0]
+        self.supervisor = self.login(SUPERVISOR_EMAIL)[0]
+        number = rng.randrange(client_count)
+        self.client = self.login(client_email(number))[0]
+        with hr.app.app_context():
+            user = hr.User.query.filter_by(email=client_email(number)).one()
+            self.own_docs = [(d.id, d.doc_type) for d in hr.Document.query.filter_by(user_id=user.id)]
+        self.payloads = [payload(rng.choice(self.own_docs)[1], rng) for _ in range(UPLOAD_PAYLOADS)]
+
+    def login(self, email):
+        c = self.app.test_client()
+        return c, c.post("/", data={"email": email, "password": PASSWORD})
+
+    def upload(self):
+        doc_type = self.rng.choice(self.own_docs)[1]
+        filename, data = self.rng.choice(self.payloads)
+        # A fresh suffix keeps every upload unique so the store path always writes a new blob; the
+        # leading bytes stay intact because ingest checks the file signature there
+        data = data + self.rng.randbytes(16)
+        return self.client.post("/client", data={"doc_type": doc_type, "file": (io.BytesIO(data), filename)})
+
+    def replace(self):
+        doc_id, _ = self.rng.choice(self.own_docs)
+        filename, data = self.rng.choice(self.payloads)
+        data = data + self.rng.randbytes(16)
+        return self.client.post("/client/docs/%d/replace" % doc_id, data={"file": (io.BytesIO(data), filename), "next": "/client"})
+
+    def step(self, scenario):
+        """Run one scenario; returns (expected status, response)."""
+        if scenario == "login":
+            return 302, self.login(client_email(self.rng.randrange(self.client_count)))[1]
+        if scenario == "client_upload":
+            return 200, self.upload()
+        if scenario == "client_replace":
+            return 302, self.replace()
+        if scenario == "admin":
+            return 200, self.admin.get("/admin")
+        if scenario == "supervisor":
+            return 200, self.supervisor.get("/supervisor")
+        if scenario == "client_docs":
+            return 200, self.supervisor.get("/clients/%d" % self.rng.choice(self.client_ids))
+        if scenario == "files":
+            return 200, self.admin.get("/files/%d" % self.rng.choice(self.doc_ids))
+        if scenario == "preview":
+            return 200, self.supervisor.get("/preview/%d" % self.rng.choice(self.doc_ids))
+        raise ValueError("unknown scenario %r" % scenario)
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def summarize(samples, elapsed):
+    latencies = sorted(ms for ms, _ in samples)
+    errors = sum(1 for _, ok in samples if not ok)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+        "max_ms": latencies[-1] if latencies else None,
+        "throughput_rps": len(samples) / elapsed if elapsed else None,
+    }
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0) if sys.platform == "darwin" else peak / 1024.0, 1)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def run(hr, duration=30, warmup=5, concurrency=8, mix=None, seed_value=1, echo=print):
+    """Drive the mix for `warmup` + `duration` seconds and return the JSON-ready report."""
+    mix = mix or DEFAULT_MIX
+    scenarios, weights = list(mix), [mix[k] for k in mix]
+    with hr.app.app_context():
+        client_count = hr.User.query.filter(hr.User.email.like("bench-client-%")).count()
+        if not client_count:
+            raise SystemExit("no bench data; run `python -m bench seed` first")
+        doc_ids = [i for (i,) in hr.db.session.query(hr.Document.id)]
+        client_ids = [i for (i,) in hr.db.session.query(hr.User.id).filter(hr.User.role == "client")]
+        dialect = hr.db.engine.dialect.name
+    echo("preparing %d workers over %d clients / %d documents" % (concurrency, client_count, len(doc_ids)))
+    workers = [Worker(hr, random.Random(seed_value * 1000 + i), client_count, doc_ids, client_ids) for i in range(concurrency)]
+
+    samples = {name: [] for name in scenarios}
+    lock = threading.Lock()
+    started_at = datetime.utcnow()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    def loop(worker):
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            scenario = worker.rng.choices(scenarios, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                expected, resp = worker.step(scenario)
+                resp.get_data()  # file routes stream; read the body so serving is timed too
+                ok = resp.status_code == expected
+                resp.close()
+            except Exception:
+                ok = False
+            t1 = time.perf_counter()
+            if t0 >= measure_from:
+                local.append((scenario, (t1 - t0) * 1000.0, ok))
+        with lock:
+            for scenario, ms, ok in local:
+                samples[scenario].append((ms, ok))
+
+    echo("running %ds (+%ds warmup) with %d threads" % (duration, warmup, concurrency))
+    threads = [threading.Thread(target=loop, args=(w,), name="bench-%d" % i) for i, w in enumerate(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - measure_from
+
+    return {
+        "started_at": started_at.isoformat() + "Z",
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "database": dialect,
+        "dataset": {"clients": client_count, "documents": len(doc_ids)},
+        "config": {"duration_s": duration, "warmup_s": warmup, "concurrency": concurrency, "mix": mix, "seed": seed_value},
+        "scenarios": {name: summarize(samples[name], elapsed) for name in scenarios},
+        "total": summarize([s for name in scenarios for s in samples[name]], elapsed),
+        "peak_rss_mb": peak_rss_mb(),
+    }
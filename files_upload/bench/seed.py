@@ -0,0 +1,151 @@
+"""Synthetic tenants: clients with one document per REQUIRED_DOCS type and realistic file sizes."""
+import hashlib
+import io
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+try:
+    from PIL import Image
+except ImportError:  # JPEG payloads then only carry a header and padding
+    Image = None
+
+PASSWORD = "bench"
+ADMIN_EMAIL = "bench-admin@bench.local"
+SUPERVISOR_EMAIL = "bench-supervisor@bench.local"
+IMAGE_TYPES = {"photo", "passport", "id_card"}
+# (min, max) bytes; scans and statements are much larger than the ID photo
+PDF_SIZES = (80 * 1024, 2 * 1024 * 1024)
+JPEG_SIZES = (150 * 1024, 3 * 1024 * 1024)
+STATUSES = ["pending", "pending", "approved", "approved", "approved", "rejected"]
+BATCH = 1000
+
+def client_email(i):
+    return "bench-client-%d@bench.local" % i
+
+def pdf_bytes(size, rng):
+    """A one-page PDF padded with an incompressible stream to roughly `size` bytes."""
+    head = b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n" \
+           b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 595 842]>>endobj\n"
+    tail = b"\ntrailer<</Root 1 0 R>>\n%%EOF\n"
+    pad = max(0, size - len(head) - len(tail) - 64)
+    body = b"4 0 obj<</Length %d>>stream\n" % pad + rng.randbytes(pad) + b"\nendstream endobj"
+    return head + body + tail
+
+def jpeg_bytes(size, rng):
+    """A decodable JPEG of noise padded after the end marker to `size` bytes."""
+    if Image is not None:
+        out = io.BytesIO()
+        Image.frombytes("RGB", (320, 240), rng.randbytes(320 * 240 * 3)).save(out, "JPEG", quality=85)
+        data = out.getvalue()
+    else:
+        data = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9"
+    return data + rng.randbytes(max(0, size - len(data)))
+
+def facts(filename, data):
+    """The metadata columns upload ingest records for a payload."""
+    if filename.endswith(".jpg"):
+        size = (320, 240) if Image is not None else (None, None)
+        return {"size_bytes": len(data), "mime_type": "image/jpeg", "width": size[0], "height": size[1], "page_count": None}
+    return {"size_bytes": len(data), "mime_type": "application/pdf", "width": None, "height": None, "page_count": 1}
+
+def payload(doc_type, rng):
+    """(filename, bytes) of a realistic upload for doc_type."""
+    if doc_type in IMAGE_TYPES:
+        return doc_type + ".jpg", jpeg_bytes(rng.randint(*JPEG_SIZES), rng)
+    return doc_type + ".pdf", pdf_bytes(rng.randint(*PDF_SIZES), rng)
+
+def _write_blob(hr, data):
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = hr._blob_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(data)
+    return sha256
+
+def reset(hr, echo=print):
+    """Delete the bench accounts with their documents and upload sessions, and files nothing else uses.
+
+    Only rows the seeder or the load mix created (bench-* accounts) are touched, so other data in a
+    shared local database survives. Files are removed here rather than by the app's reaper thread,
+    which this short-lived process would not wait for.
+    """
+    db, User, Document, UploadSession = hr.db, hr.User, hr.Document, hr.UploadSession
+    ids = [uid for (uid,) in db.session.query(User.id).filter(User.email.like("bench-%"))]
+    refs, partials = Counter(), []
+    for start in range(0, len(ids), BATCH):
+        chunk = ids[start:start + BATCH]
+        refs.update(sha for (sha,) in db.session.query(Document.blob_sha256).filter(Document.user_id.in_(chunk), Document.blob_sha256.isnot(None)))
+        partials += [hr._partial_path(sid) for (sid,) in db.session.query(UploadSession.id).filter(UploadSession.user_id.in_(chunk))]
+        UploadSession.query.filter(UploadSession.user_id.in_(chunk)).delete(synchronize_session=False)
+        Document.query.filter(Document.user_id.in_(chunk)).delete(synchronize_session=False)
+        User.query.filter(User.id.in_(chunk)).delete(synchronize_session=False)
+    for sha256, count in refs.items():
+        hr._release_blob(sha256, count)
+    db.session.info.pop("pending_removals", None)
+    db.session.commit()
+    freed = sum(hr._remove_blob_file(sha256, time.time()) for sha256 in refs)
+    for path in partials:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    echo("removed %d bench accounts, %.1f MB of files" % (len(ids), freed / 1e6))
+
+def seed(hr, clients, blob_pool=200, seed_value=1, echo=print):
+    """Insert bench accounts and `clients` clients with a document for every REQUIRED_DOCS type.
+
+    Files come from a pool of `blob_pool` distinct payloads spread over the types, shared through the blob
+    reference counts the way identical uploads are, so disk usage stays bounded.
+    """
+    rng = random.Random(seed_value)
+    db, User, Document, Blob = hr.db, hr.User, hr.Document, hr.Blob
+    if User.query.filter(User.email.like("bench-%")).first():
+        raise SystemExit("database already holds bench data; use a fresh --data-dir or --reset")
+    password = hr.generate_password_hash(PASSWORD)
+    db.session.add(User(email=ADMIN_EMAIL, name="bench admin", password=password, role="admin"))
+    db.session.add(User(email=SUPERVISOR_EMAIL, name="bench supervisor", password=password, role="supervisor"))
+    db.session.commit()
+
+    pool = {}
+    for d in hr.REQUIRED_DOCS:
+        entries = []
+        for _ in range(max(1, blob_pool // len(hr.REQUIRED_DOCS))):
+            filename, data = payload(d["key"], rng)
+            entries.append((filename, _write_blob(hr, data), facts(filename, data)))
+        pool[d["key"]] = entries
+    echo("wrote %d blobs" % sum(len(v) for v in pool.values()))
+
+    sizes = {sha256: meta["size_bytes"] for entries in pool.values() for _, sha256, meta in entries}
+    refs = Counter()
+    now = datetime.utcnow()
+    for start in range(0, clients, BATCH):
+        numbers = range(start, min(start + BATCH, clients))
+        db.session.execute(db.insert(User), [
+            {"email": client_email(i), "name": "عميل %d" % i, "password": password, "role": "client"} for i in numbers
+        ])
+        ids = [uid for (uid,) in db.session.query(User.id).filter(User.email.in_([client_email(i) for i in numbers]))]
+        docs = []
+        for uid in ids:
+            for d in hr.REQUIRED_DOCS:
+                filename, sha256, meta = rng.choice(pool[d["key"]])
+                refs[sha256] += 1
+                status = rng.choice(STATUSES)
+                created = now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))
+                docs.append(dict(meta, **{
+                    "user_id": uid, "doc_type": d["key"], "filename": filename, "blob_sha256": sha256, "status": status,
+                    "created_at": created,
+                    "reviewed_at": created + timedelta(hours=rng.randint(1, 72)) if status != "pending" else None,
+                    "reason": "صورة غير واضحة" if status == "rejected" else None,
+                }))
+        db.session.execute(db.insert(Document), docs)
+        db.session.commit()
+        echo("seeded %d/%d clients" % (numbers.stop, clients))
+    db.session.execute(db.insert(Blob), [{"sha256": sha256, "size": sizes[sha256], "ref_count": count, "created_at": now} for sha256, count in refs.items()])
+    db.session.commit()
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    return {"clients": clients, "documents": clients * len(hr.REQUIRED_DOCS), "blobs": len(refs)}
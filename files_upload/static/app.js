@@ -10,29 +10,53 @@ document.addEventListener('DOMContentLoaded',function(){
     });
   });
 
-  // Preview modal (client & admin views)
+  // Preview modal (client & admin views); delegated so rows added by server search work too.
+  // When a downscaled rendition exists it is shown first and the original loads on request.
   var modalEl=document.getElementById('previewModal');
   var iframe=document.getElementById('filePreview');
-  document.querySelectorAll('.btn-preview').forEach(function(btn){
-    if(btn.dataset.init) return; btn.dataset.init='1';
-    btn.addEventListener('click',function(){
-      var src = btn.getAttribute('data-src');
-      if(iframe && src){ iframe.src=src; }
-      if(modalEl && typeof bootstrap!=='undefined'){
-        var m=bootstrap.Modal.getOrCreateInstance(modalEl);
-        m.show();
-      }
-    });
+  var renditionBox=null, renditionImg=null, originalSrc='';
+  if(modalEl && iframe){
+    iframe.insertAdjacentHTML('beforebegin','<div class="preview-rendition d-none text-center p-2"><img class="img-fluid" alt=""><div class="p-2"><button type="button" class="btn btn-sm btn-outline-primary btn-load-original">عرض الملف الأصلي</button></div></div>');
+    renditionBox=modalEl.querySelector('.preview-rendition');
+    renditionImg=renditionBox.querySelector('img');
+  }
+  var showOriginal=function(){
+    if(renditionBox) renditionBox.classList.add('d-none');
+    if(iframe){ iframe.classList.remove('d-none'); iframe.src=originalSrc; }
+  };
+  if(renditionImg){
+    renditionImg.addEventListener('error',function(){ if(renditionImg.getAttribute('src')) showOriginal(); });
+    renditionBox.querySelector('.btn-load-original').addEventListener('click',showOriginal);
+  }
+  document.addEventListener('click',function(e){
+    var btn=e.target.closest('.btn-preview');
+    if(!btn) return;
+    originalSrc = btn.getAttribute('data-src') || '';
+    var rendition = btn.getAttribute('data-rendition');
+    if(rendition && renditionImg){
+      iframe.classList.add('d-none'); iframe.src='';
+      renditionBox.classList.remove('d-none');
+      renditionImg.src=rendition;
+    } else if(iframe && originalSrc){
+      showOriginal();
+    }
+    if(modalEl && typeof bootstrap!=='undefined' && !btn.hasAttribute('data-bs-toggle')){
+      var m=bootstrap.Modal.getOrCreateInstance(modalEl);
+      m.show();
+    }
   });
   if(modalEl && !modalEl.dataset.init){
     modalEl.dataset.init='1';
-    modalEl.addEventListener('hidden.bs.modal',function(){ if(iframe) iframe.src=''; });
+    modalEl.addEventListener('hidden.bs.modal',function(){
+      if(iframe) iframe.src='';
+      if(renditionImg) renditionImg.removeAttribute('src');
+    });
   }
 
   // Inline reject panel actions
-  document.querySelectorAll('.btn-reject').forEach(function(btn){
-    if(btn.dataset.init) return; btn.dataset.init='1';
-    btn.addEventListener('click',function(){
+  document.addEventListener('click',function(e){
+    var btn=e.target.closest('.btn-reject');
+    if(btn){
       var tr = btn.closest('tr');
       var panelRow = tr ? tr.nextElementSibling : null;
       document.querySelectorAll('tr.reject-row').forEach(function(r){
@@ -43,14 +67,13 @@ document.addEventListener('DOMContentLoaded',function(){
         var ta = panelRow.querySelector('textarea');
         if(ta){ setTimeout(function(){ ta.focus(); }, 100); }
       }
-    });
-  });
-  document.querySelectorAll('.btn-cancel-reject').forEach(function(btn){
-    if(btn.dataset.init) return; btn.dataset.init='1';
-    btn.addEventListener('click',function(){
-      var row = btn.closest('tr.reject-row');
+      return;
+    }
+    var cancel=e.target.closest('.btn-cancel-reject');
+    if(cancel){
+      var row = cancel.closest('tr.reject-row');
       if(row){ row.classList.add('d-none'); }
-    });
+    }
   });
 
   // Support notice toast (login)
@@ -85,7 +108,69 @@ document.addEventListener('DOMContentLoaded',function(){
     });
   });
 
-  // Table search filtering (admin tables)
+  // Chunked, resumable uploads (client page). Each chunk is sent at the server's committed
+  // offset; after a network error the offset is re-read with HEAD and the upload continues.
+  var sendChunks = function(info, file, onProgress){
+    return new Promise(function(resolve, reject){
+      var retries = 0;
+      var step = function(offset){
+        var end = Math.min(offset + info.chunk_size, file.size);
+        fetch(info.url, {method:'PATCH', credentials:'same-origin', headers:{'Upload-Offset':String(offset), 'Content-Type':'application/offset+octet-stream'}, body:file.slice(offset, end)})
+          .then(function(r){ return r.json().then(function(d){ return {status:r.status, data:d}; }); })
+          .then(function(res){
+            if(res.status === 409 && typeof res.data.offset === 'number'){ step(res.data.offset); return; }
+            if(res.status !== 200){ reject(res.data.error || null); return; }
+            retries = 0;
+            onProgress(res.data.offset / file.size);
+            if(res.data.complete){ resolve(res.data); } else { step(res.data.offset); }
+          })
+          .catch(function(){
+            if(++retries > 5){ reject(null); return; }
+            setTimeout(function(){
+              fetch(info.url, {method:'HEAD', credentials:'same-origin'})
+                .then(function(r){ step(parseInt(r.headers.get('Upload-Offset') || '0', 10)); })
+                .catch(function(){ step(offset); });
+            }, 1000 * retries);
+          });
+      };
+      step(info.offset || 0);
+    });
+  };
+  if(window.fetch && window.Promise && window.Blob && Blob.prototype.slice){
+    document.querySelectorAll('form[data-upload-url]').forEach(function(form){
+      if(form.dataset.init) return; form.dataset.init='1';
+      form.addEventListener('submit',function(e){
+        var input = form.querySelector('input[type=file]');
+        var file = input && input.files ? input.files[0] : null;
+        if(!file) return;
+        e.preventDefault();
+        var btn = form.querySelector('button');
+        if(btn) btn.disabled = true;
+        var bar = form.querySelector('.progress-bar');
+        if(!bar){
+          form.insertAdjacentHTML('beforeend','<div class="progress mt-2" style="height:6px"><div class="progress-bar" role="progressbar" style="width:0%"></div></div>');
+          bar = form.querySelector('.progress-bar');
+        }
+        var body = {filename:file.name, length:file.size, fingerprint:String(file.lastModified || '')};
+        var docType = form.querySelector('input[name=doc_type]');
+        if(docType) body.doc_type = docType.value;
+        if(form.dataset.documentId) body.document_id = form.dataset.documentId;
+        fetch(form.getAttribute('data-upload-url'), {method:'POST', credentials:'same-origin', headers:{'Content-Type':'application/json'}, body:JSON.stringify(body)})
+          .then(function(r){ return r.json().then(function(d){ return {ok:r.ok, data:d}; }); })
+          .then(function(res){
+            if(!res.ok) throw res.data.error || null;
+            return sendChunks(res.data, file, function(p){ bar.style.width = Math.round(p * 100) + '%'; });
+          })
+          .then(function(){ window.location.reload(); })
+          .catch(function(err){
+            if(btn) btn.disabled = false;
+            alert(typeof err === 'string' ? err : 'تعذر رفع الملف، حاول مرة أخرى لاستكمال الرفع');
+          });
+      });
+    });
+  }
+
+  // Table search filtering (small, fully rendered tables such as the users list)
   document.querySelectorAll('.table-search').forEach(function(input){
     if(input.dataset.init) return; input.dataset.init='1';
     var targetSel = input.getAttribute('data-target');
@@ -101,4 +186,249 @@ document.addEventListener('DOMContentLoaded',function(){
     };
     input.addEventListener('input', filter);
   });
+
+  // Server-side search and keyset paging (dashboard tables, via /api/clients and /api/documents)
+  var esc = function(v){
+    return String(v === null || v === undefined ? '' : v).replace(/[&<>"']/g,function(c){
+      return {'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c];
+    });
+  };
+  var statusLabel = function(s){ return s==='approved' ? 'مقبول' : s==='rejected' ? 'مرفوض' : 'قيد المراجعة'; };
+  var next = encodeURIComponent(window.location.pathname);
+  var rowRenderers = {
+    clients: function(c){
+      return '<tr data-client-id="'+esc(c.id)+'"><td><a href="'+esc(c.url)+'">'+esc(c.name)+'</a></td>'+
+        '<td class="text-muted">'+esc(c.email)+'</td>'+
+        '<td><span class="badge bg-info">'+esc(c.file_count)+'</span></td>'+
+        '<td class="d-flex gap-1"><span class="badge badge-status pending" title="قيد المراجعة">'+esc(c.pending_count)+'</span><span class="badge badge-status approved" title="مقبول">'+esc(c.approved_count)+'</span><span class="badge badge-status rejected" title="مرفوض">'+esc(c.rejected_count)+'</span></td>'+
+        '<td>'+esc(c.last_upload_local)+'</td>'+
+        '<td><a class="btn btn-sm btn-outline-primary" href="'+esc(c.url)+'">فتح</a></td></tr>';
+    },
+    documents: function(d){
+      return '<tr data-doc-id="'+esc(d.id)+'"><td><input type="checkbox" class="form-check-input bulk-select" value="'+esc(d.id)+'" aria-label="تحديد"></td>'+
+        '<td>'+(d.thumb_url ? '<img class="doc-thumb" src="'+esc(d.thumb_url)+'" alt="" loading="lazy" onerror="this.remove()">' : '')+
+        '<a class="filename" href="'+esc(d.download_url)+'">'+esc(d.filename)+'</a><small class="file-facts">'+esc(d.meta)+'</small></td>'+
+        '<td class="text-muted">'+esc(d.doc_type_label)+'</td>'+
+        '<td class="text-muted">'+esc(d.user_name || 'Unknown')+'</td>'+
+        '<td><span class="badge badge-status '+esc(d.status)+'">'+statusLabel(d.status)+'</span></td>'+
+        '<td>'+esc(d.created_at_local)+'</td>'+
+        '<td class="d-flex gap-2"><button type="button" class="btn btn-sm btn-outline-secondary btn-preview" data-src="'+esc(d.preview_url)+'"'+(d.rendition_url ? ' data-rendition="'+esc(d.rendition_url)+'"' : '')+'>عرض</button>'+
+        '<a href="'+esc(d.download_url)+'" class="btn btn-sm btn-outline-primary">تحميل</a>'+
+        '<a href="'+esc(d.approve_url)+'?next='+next+'" class="btn btn-approve btn-sm">قبول</a>'+
+        '<button type="button" class="btn btn-reject btn-sm" data-id="'+esc(d.id)+'">رفض</button></td></tr>'+
+        '<tr class="reject-row d-none"><td colspan="7"><div class="reject-panel">'+
+        '<form class="reject-form" method="post" action="'+esc(d.reject_url)+'">'+
+        '<div class="mb-3"><label for="rejectReason'+esc(d.id)+'" class="form-label">اكتب سبب الرفض</label>'+
+        '<textarea id="rejectReason'+esc(d.id)+'" name="reason" class="form-control" rows="3" placeholder="مثال: المستند غير واضح أو ناقص"></textarea></div>'+
+        '<input type="hidden" name="next" value="'+esc(window.location.pathname)+'">'+
+        '<div class="d-flex justify-content-end gap-2"><button type="button" class="btn btn-secondary btn-cancel-reject">إلغاء</button>'+
+        '<button type="submit" class="btn btn-danger">تأكيد الرفض</button></div></form></div></td></tr>';
+    }
+  };
+  // Completeness matrix columns follow the header (one per required document type)
+  var completenessTypes = [];
+  var completenessForm = document.querySelector('form.table-filters[data-kind="completeness"]');
+  if(completenessForm){
+    var missingSelect = completenessForm.querySelector('select[name=missing]');
+    Array.prototype.forEach.call(missingSelect ? missingSelect.options : [], function(o){ if(o.value) completenessTypes.push(o.value); });
+  }
+  rowRenderers.completeness = function(c){
+    return '<tr><td><a href="'+esc(c.url)+'">'+esc(c.name)+'</a><div class="text-muted small">'+esc(c.email)+'</div></td>'+
+      '<td><span class="badge bg-info">'+esc(c.provided)+'/'+esc(c.required)+'</span></td>'+
+      completenessTypes.map(function(k){
+        var st = c.docs[k];
+        return '<td>'+(st ? '<span class="badge badge-status '+esc(st)+'">'+statusLabel(st)+'</span>' : '<span class="badge badge-status missing">ناقص</span>')+'</td>';
+      }).join('')+'</tr>';
+  };
+  document.querySelectorAll('form.table-filters').forEach(function(form){
+    if(form.dataset.init) return; form.dataset.init='1';
+    var targetSel = form.getAttribute('data-target');
+    var table = document.querySelector(targetSel);
+    var more = document.querySelector('.table-more[data-target="'+targetSel+'"]');
+    var render = rowRenderers[form.getAttribute('data-kind')];
+    if(!table || !render) return;
+    var seq = 0;
+    var load = function(append){
+      var params = new URLSearchParams();
+      new FormData(form).forEach(function(v,k){ if(v) params.append(k,v); });
+      if(append && more && more.dataset.cursor){ params.set('cursor', more.dataset.cursor); }
+      var mine = ++seq;
+      fetch(form.getAttribute('data-endpoint')+'?'+params.toString(),{credentials:'same-origin'})
+        .then(function(r){ return r.json(); })
+        .then(function(data){
+          if(mine !== seq || !data.items) return;
+          var tbody = table.querySelector('tbody');
+          var html = data.items.map(render).join('');
+          if(append){ tbody.insertAdjacentHTML('beforeend', html); } else { tbody.innerHTML = html; }
+          if(more){
+            more.dataset.cursor = data.next_cursor || '';
+            more.classList.toggle('d-none', !data.next_cursor);
+          }
+        });
+    };
+    var timer = null;
+    var schedule = function(){ clearTimeout(timer); timer = setTimeout(function(){ load(false); }, 300); };
+    form.addEventListener('input', schedule);
+    form.addEventListener('change', schedule);
+    if(more){ more.addEventListener('click', function(){ load(true); }); }
+    // Export links download everything matching the current filters, not just the visible page
+    form.querySelectorAll('.table-export').forEach(function(link){
+      link.addEventListener('click',function(){
+        var params = new URLSearchParams();
+        new FormData(form).forEach(function(v,k){ if(v) params.append(k,v); });
+        link.href = link.href.split('?')[0] + (params.toString() ? '?' + params.toString() : '');
+      });
+    });
+  });
+
+  // Bulk review: select rows, then approve/reject them in one request and update badges in place
+  document.querySelectorAll('.bulk-toolbar').forEach(function(bar){
+    if(bar.dataset.init) return; bar.dataset.init='1';
+    var table = document.querySelector(bar.getAttribute('data-target'));
+    if(!table) return;
+    var selected = function(){ return Array.prototype.slice.call(table.querySelectorAll('.bulk-select:checked')); };
+    var refresh = function(){
+      var n = selected().length;
+      bar.querySelector('.bulk-count').textContent = n;
+      bar.querySelectorAll('.bulk-action').forEach(function(b){ b.disabled = n === 0; });
+    };
+    table.addEventListener('change',function(e){
+      if(e.target.classList.contains('bulk-select-all')){
+        table.querySelectorAll('.bulk-select').forEach(function(cb){ cb.checked = e.target.checked; });
+      }
+      refresh();
+    });
+    bar.querySelectorAll('.bulk-action').forEach(function(btn){
+      btn.addEventListener('click',function(){
+        var boxes = selected();
+        if(!boxes.length) return;
+        var status = btn.getAttribute('data-status');
+        var reasonInput = bar.querySelector('.bulk-reason');
+        var payload = {ids: boxes.map(function(cb){ return parseInt(cb.value, 10); }), status: status};
+        if(status === 'rejected' && reasonInput && reasonInput.value.trim()){ payload.reason = reasonInput.value.trim(); }
+        bar.querySelectorAll('.bulk-action').forEach(function(b){ b.disabled = true; });
+        fetch(bar.getAttribute('data-endpoint'), {method:'POST', credentials:'same-origin', headers:{'Content-Type':'application/json', 'Accept':'application/json'}, body:JSON.stringify(payload)})
+          .then(function(r){ return r.json(); })
+          .then(function(data){
+            if(!data.results){ alert(data.error || 'تعذر تحديث المستندات'); return; }
+            data.results.forEach(function(res){
+              var cb = table.querySelector('.bulk-select[value="'+res.id+'"]');
+              if(!cb || !res.ok) return;
+              cb.checked = false;
+              var badge = cb.closest('tr').querySelector('.badge-status');
+              if(badge){ badge.className = 'badge badge-status ' + res.status; badge.textContent = statusLabel(res.status); }
+            });
+            var all = table.querySelector('.bulk-select-all');
+            if(all) all.checked = false;
+            if(reasonInput) reasonInput.value = '';
+          })
+          .catch(function(){ alert('تعذر تحديث المستندات'); })
+          .then(refresh);
+      });
+    });
+  });
+
+  // Live dashboard: document events from /events update rows in place; new and replaced
+  // documents move to the top of the latest-documents table unless a filter is active
+  document.querySelectorAll('[data-live]').forEach(function(el){
+    if(el.dataset.liveInit || !window.EventSource) return; el.dataset.liveInit='1';
+    var filtered = function(sel){
+      var form = document.querySelector('form.table-filters[data-target="'+sel+'"]');
+      var active = false;
+      if(form) new FormData(form).forEach(function(v){ if(v) active = true; });
+      return active;
+    };
+    var removeDoc = function(row){
+      var panel = row.nextElementSibling;
+      if(panel && panel.classList.contains('reject-row')) panel.remove();
+      row.remove();
+    };
+    var updateDocument = function(ev){
+      var table = document.querySelector('#latestDocsTable');
+      var d = ev.document;
+      if(!table || !d) return;
+      var tbody = table.querySelector('tbody');
+      var row = tbody.querySelector('tr[data-doc-id="'+d.id+'"]');
+      if(ev.type === 'reviewed'){
+        // Only the status changed: keep the row (and any selection or open reject panel)
+        if(!row) return;
+        var badge = row.querySelector('.badge-status');
+        if(badge){ badge.className = 'badge badge-status ' + d.status; badge.textContent = statusLabel(d.status); }
+        return;
+      }
+      if(filtered('#latestDocsTable')){
+        if(row){ row.insertAdjacentHTML('beforebegin', rowRenderers.documents(d)); removeDoc(row); }
+        return;
+      }
+      if(row) removeDoc(row);
+      tbody.insertAdjacentHTML('afterbegin', rowRenderers.documents(d));
+    };
+    var updateClient = function(c){
+      var table = document.querySelector('#clientsTable');
+      if(!table || !c) return;
+      var tbody = table.querySelector('tbody');
+      var row = tbody.querySelector('tr[data-client-id="'+c.id+'"]');
+      if(row){ row.insertAdjacentHTML('beforebegin', rowRenderers.clients(c)); row.remove(); return; }
+      // Clients are listed newest account first; a client new to the list goes on top
+      var first = tbody.querySelector('tr[data-client-id]');
+      if(!filtered('#clientsTable') && (!first || parseInt(first.getAttribute('data-client-id'), 10) < c.id)){
+        tbody.insertAdjacentHTML('afterbegin', rowRenderers.clients(c));
+      }
+    };
+    var source = new EventSource(el.getAttribute('data-live'));
+    source.addEventListener('document', function(e){
+      var ev = JSON.parse(e.data);
+      updateDocument(ev);
+      updateClient(ev.client);
+    });
+    source.addEventListener('reset', function(){
+      // Changes were missed (server restart or a long disconnect): reload the tables from the API
+      document.querySelectorAll('form.table-filters').forEach(function(form){ form.dispatchEvent(new Event('change')); });
+    });
+  });
+  // Batch upload (client page): all chosen files go in one request; each card, its chip and the
+  // batch form are updated from the per-document results instead of reloading the page
+  document.querySelectorAll('form.batch-upload').forEach(function(form){
+    if(form.dataset.init || !window.fetch || !window.FormData) return; form.dataset.init='1';
+    var updateCard = function(d){
+      var card = document.getElementById('doc-'+d.doc_type);
+      var chip = document.querySelector('.doc-chip[data-target="doc-'+d.doc_type+'"] .chip-status');
+      if(chip){ chip.className = 'chip-status ' + d.status; chip.textContent = statusLabel(d.status); }
+      if(!card) return;
+      var badge = card.querySelector('.doc-card-header .badge-status');
+      if(badge){ badge.className = 'badge badge-status ' + d.status; badge.textContent = statusLabel(d.status); }
+      var values = card.querySelectorAll('.meta-value');
+      if(values.length === 3){ values[0].textContent = d.created_at_local; values[1].textContent = '—'; values[2].textContent = '—'; }
+      var actions = card.querySelector('.doc-actions');
+      if(actions){
+        actions.innerHTML = '<button type="button" class="btn btn-sm btn-outline-primary btn-preview" data-bs-toggle="modal" data-bs-target="#previewModal" data-src="'+esc(d.preview_url)+'"'+(d.rendition_url ? ' data-rendition="'+esc(d.rendition_url)+'"' : '')+'>عرض</button> '+
+          '<a href="'+esc(d.download_url)+'" class="btn btn-sm btn-primary">تحميل</a>';
+      }
+      card.querySelectorAll('.upload-zone, .replace-form').forEach(function(f){ f.remove(); });
+    };
+    form.addEventListener('submit', function(e){
+      var chosen = Array.prototype.some.call(form.querySelectorAll('input[type=file]'), function(i){ return i.files && i.files.length; });
+      e.preventDefault();
+      if(!chosen){ alert('يجب اختيار ملف'); return; }
+      var btn = form.querySelector('button');
+      if(btn) btn.disabled = true;
+      fetch(form.getAttribute('action'), {method:'POST', credentials:'same-origin', headers:{'Accept':'application/json'}, body:new FormData(form)})
+        .then(function(r){ return r.json(); })
+        .then(function(data){
+          if(!data.results){ alert(data.error || 'تعذر رفع الملفات'); return; }
+          data.results.forEach(function(res){
+            var row = form.querySelector('.batch-row[data-doc-type="'+res.doc_type+'"]');
+            if(res.ok){
+              updateCard(res.document);
+              if(row) row.remove();
+            } else if(row){
+              row.querySelector('.batch-error').textContent = res.error === 'unsupported file type' ? 'صيغة الملف غير مسموحة: PDF أو صورة (PNG, JPG, JPEG)' : res.error;
+            }
+          });
+          if(!form.querySelector('.batch-row')) form.remove();
+        })
+        .catch(function(){ alert('تعذر رفع الملفات، حاول مرة أخرى'); })
+        .then(function(){ if(btn) btn.disabled = false; });
+    });
+  });
 });
\ No newline at end of file